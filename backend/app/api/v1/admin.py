@@ -1,26 +1,26 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.db.session import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_async_db
 
 router = APIRouter()
 
 
 @router.get("/users")
-async def list_users(db: Session = Depends(get_db)):
+async def list_users(db: AsyncSession = Depends(get_async_db)):
     """List all users (admin only)."""
     # TODO: Implement user listing with admin check
     return {"users": []}
 
 
 @router.get("/analytics")
-async def get_analytics(db: Session = Depends(get_db)):
+async def get_analytics(db: AsyncSession = Depends(get_async_db)):
     """Get system analytics (admin only)."""
     # TODO: Implement analytics
     return {"analytics": {}}
 
 
 @router.put("/users/{user_id}/profile")
-async def edit_user_profile(user_id: str, db: Session = Depends(get_db)):
+async def edit_user_profile(user_id: str, db: AsyncSession = Depends(get_async_db)):
     """Edit user profile (admin only)."""
     # TODO: Implement admin profile editing
     return {"status": "updated"}
@@ -1,13 +1,13 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.db.session import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_async_db
 from app.models.schemas import UserCreate, UserLogin, TokenResponse
 
 router = APIRouter()
 
 
 @router.post("/register", response_model=TokenResponse)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Register new user."""
     # TODO: Implement user registration
     return {
@@ -18,7 +18,7 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=TokenResponse)
-async def login(credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Login user."""
     # TODO: Implement user login
     return {
@@ -29,7 +29,7 @@ async def login(credentials: UserLogin, db: Session = Depends(get_db)):
 
 
 @router.post("/refresh", response_model=TokenResponse)
-async def refresh_token(db: Session = Depends(get_db)):
+async def refresh_token(db: AsyncSession = Depends(get_async_db)):
     """Refresh access token."""
     # TODO: Implement token refresh
     return {
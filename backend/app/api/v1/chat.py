@@ -1,6 +1,11 @@
+from typing import AsyncIterator
+import orjson
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.db.session import get_db
+from fastapi.responses import StreamingResponse
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_async_db, AsyncSessionLocal
 from app.models.schemas import ChatMessageRequest, ChatMessageResponse
 from app.models.database import User
 from app.core.orchestrator import chat_orchestrator
@@ -10,11 +15,48 @@ logger = get_logger(__name__)
 
 router = APIRouter()
 
+# Development placeholder for user identification
+DEMO_USER_ID = "demo_user_123"
+
+# User IDs known to have a User row in this process (skips the per-request SELECT)
+_KNOWN_USERS: set = set()
+
+
+async def ensure_user(db: AsyncSession, user_id: str) -> None:
+    """
+    Ensure a User row exists (FK constraint requires one), creating the demo user if needed.
+    
+    Args:
+        db: Database session
+        user_id: User identifier
+    """
+    if user_id in _KNOWN_USERS:
+        return
+    
+    # INSERT ... ON CONFLICT DO NOTHING: concurrent first requests for the
+    # same user (across workers) cannot hit a unique violation
+    insert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    result = await db.execute(
+        insert(User)
+        .values(
+            user_id=user_id,
+            email=f"{user_id}@example.com",  # email is unique too
+            hashed_password="N/A",
+            full_name="Demo User"
+        )
+        .on_conflict_do_nothing(index_elements=[User.user_id])
+    )
+    await db.commit()
+    if result.rowcount:
+        logger.info(f"Auto-created demo user: {user_id}")
+    
+    _KNOWN_USERS.add(user_id)
+
 
 @router.post("/", response_model=ChatMessageResponse)
 async def chat(
     request: ChatMessageRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Process chat message and return response with observability data.
@@ -27,20 +69,10 @@ async def chat(
         Chat response with memory dashboard data
     """
     try:
-        # Development placeholder for user identification
-        user_id = "demo_user_123"
+        user_id = DEMO_USER_ID
         
-        # Ensure demo user exists (FK constraint requires a User row)
-        if not db.query(User).filter(User.user_id == user_id).first():
-            demo_user = User(
-                user_id=user_id,
-                email="demo@example.com",
-                hashed_password="N/A",
-                full_name="Demo User"
-            )
-            db.add(demo_user)
-            db.commit()
-            logger.info(f"Auto-created demo user: {user_id}")
+        # No-op after startup, which already ensured the demo user
+        await ensure_user(db, user_id)
         
         logger.info(f"Received chat request from user: {user_id}")
         
@@ -58,9 +90,57 @@ async def chat(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _sse(event: str, data) -> bytes:
+    """Encode one Server-Sent Event with a JSON payload."""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+@router.post("/stream")
+async def chat_stream(request: ChatMessageRequest):
+    """
+    Process chat message, streaming the response as Server-Sent Events.
+    
+    Emits "start", one "token" per text delta, then "done" with the same
+    body as POST /chat/ ("error" if the pipeline fails mid-stream).
+    
+    Args:
+        request: Chat message request
+        
+    Returns:
+        text/event-stream response
+    """
+    user_id = DEMO_USER_ID
+    logger.info(f"Received streaming chat request from user: {user_id}")
+    
+    async def events() -> AsyncIterator[bytes]:
+        # The session is opened here rather than via Depends: yield
+        # dependencies are torn down before a streamed body is sent
+        async with AsyncSessionLocal() as db:
+            try:
+                await ensure_user(db, user_id)
+                
+                async for event in chat_orchestrator.process_message_stream(
+                    user_id=user_id,
+                    user_message=request.message,
+                    conversation_id=request.conversation_id,
+                    db=db
+                ):
+                    yield _sse(event["event"], event["data"])
+                    
+            except Exception as e:
+                logger.error(f"Error streaming chat message: {e}", exc_info=True)
+                yield _sse("error", {"detail": str(e)})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/conversations")
 async def list_conversations(
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """List all conversations for the current user."""
     # TODO: Implement conversation listing
@@ -70,7 +150,7 @@ async def list_conversations(
 @router.get("/conversations/{conversation_id}")
 async def get_conversation(
     conversation_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get specific conversation with all messages."""
     # TODO: Implement conversation retrieval
@@ -1,12 +1,12 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.db.session import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_async_db
 
 router = APIRouter()
 
 
 @router.get("/profile")
-async def get_user_profile(db: Session = Depends(get_db)):
+async def get_user_profile(db: AsyncSession = Depends(get_async_db)):
     """Get user profile (long-term memory)."""
     from app.memory.long_term import LongTermMemory
     ltm = LongTermMemory()
@@ -15,21 +15,21 @@ async def get_user_profile(db: Session = Depends(get_db)):
 
 
 @router.put("/profile")
-async def update_user_profile(db: Session = Depends(get_db)):
+async def update_user_profile(db: AsyncSession = Depends(get_async_db)):
     """Update user profile."""
     # TODO: Implement profile update
     return {"status": "updated"}
 
 
 @router.post("/feedback")
-async def submit_feedback(db: Session = Depends(get_db)):
+async def submit_feedback(db: AsyncSession = Depends(get_async_db)):
     """Submit feedback correction."""
     # TODO: Implement feedback submission
     return {"status": "submitted"}
 
 
 @router.delete("/clear")
-async def clear_memory(db: Session = Depends(get_db)):
+async def clear_memory(db: AsyncSession = Depends(get_async_db)):
     """Clear all memory for current user."""
     # TODO: Implement memory clearing
     return {"status": "cleared"}
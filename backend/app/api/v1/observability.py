@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.db.session import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_async_db
 
 router = APIRouter()
 
@@ -13,14 +13,14 @@ async def get_metrics():
 
 
 @router.get("/traces/{request_id}")
-async def get_request_trace(request_id: str, db: Session = Depends(get_db)):
+async def get_request_trace(request_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get detailed request trace."""
     # TODO: Implement trace retrieval
     return {"request_id": request_id, "trace": {}}
 
 
 @router.get("/memory-logs")
-async def get_memory_logs(db: Session = Depends(get_db)):
+async def get_memory_logs(db: AsyncSession = Depends(get_async_db)):
     """Get memory access logs."""
     # TODO: Implement memory log retrieval
     return {"logs": []}
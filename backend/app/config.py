@@ -1,4 +1,5 @@
-from pydantic_settings import BaseSettings
+from functools import lru_cache
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import Optional
 
 
@@ -10,6 +11,12 @@ class Settings(BaseSettings):
     
     # Database
     database_url: str = "sqlite:///./data/memorychat.db"
+    db_pool_size: int = 20
+    db_max_overflow: int = 40
+    db_pool_timeout: int = 10  # Seconds to wait for a free connection
+    db_pool_recycle: int = 1800  # Recycle connections older than 30 minutes
+    db_pool_pre_ping: bool = True
+    sql_echo: bool = False  # Log every SQL statement (slow; opt-in for debugging)
     
     # ChromaDB
     chroma_persist_dir: str = "./data/chroma"
@@ -18,6 +25,9 @@ class Settings(BaseSettings):
     redis_host: str = "localhost"
     redis_port: int = 6379
     redis_enabled: bool = False  # Disable for MVP
+    embedding_cache_ttl_seconds: int = 86400  # Embeddings are deterministic
+    embedding_local_cache_size: int = 4096  # In-process embeddings per worker
+    memory_cache_ttl_seconds: int = 10  # Absorbs retries / UI polling
     
     # JWT Authentication
     jwt_secret_key: str
@@ -32,11 +42,20 @@ class Settings(BaseSettings):
     openai_api_key: Optional[str] = None
     anthropic_api_key: Optional[str] = None
     groq_api_key: Optional[str] = None
+    openai_api_keys: str = ""  # Extra comma-separated keys, used round-robin
+    groq_api_keys: str = ""
     default_llm_provider: str = "groq"
     default_model: str = "llama-3.3-70b-versatile"
+    llm_http_max_connections: int = 100  # Shared provider HTTP pool
+    llm_http_max_keepalive_connections: int = 50
+    llm_max_retries: int = 3  # SDK retries (exponential backoff) on 429/5xx/connection errors
+    llm_circuit_failure_threshold: int = 5  # Consecutive failed calls before failing fast
+    llm_circuit_reset_seconds: int = 30
     
     # Embedding Service
     embedding_model: str = "text-embedding-ada-002"
+    embedding_backend: str = "torch"  # Local MiniLM runtime: torch | onnx (needs optimum[onnxruntime])
+    embedding_onnx_path: Optional[str] = None  # Pre-exported (e.g. int8-quantized) ONNX model dir
     
     # Rate Limiting
     rate_limit_free: str = "10/minute"
@@ -50,22 +69,65 @@ class Settings(BaseSettings):
     
     # Memory Configuration
     max_short_term_messages: int = 20
+    short_term_cache_size: int = 10000  # Cached conversations per worker
     max_semantic_results: int = 5
     semantic_similarity_threshold: float = 0.3
+    semantic_flush_batch_size: int = 64  # Queued embeddings per ChromaDB add()
+    semantic_flush_interval_ms: int = 50  # Max delay before queued embeddings are written
+    semantic_query_cache_size: int = 2048
+    semantic_query_cache_ttl_seconds: int = 300
+    semantic_query_cache_bits: int = 64  # LSH hyperplanes per query key
+    semantic_query_cache_similarity: float = 0.97  # Cosine for a near-duplicate cache hit
+    semantic_hnsw_m: int = 24  # Graph degree (ChromaDB default 16)
+    semantic_hnsw_construction_ef: int = 200  # Build-time candidate list (default 100)
+    semantic_hnsw_search_ef: int = 100  # Query-time candidate list (default 10)
+    semantic_query_batch_size: int = 32  # Max queries coalesced into one ChromaDB call
+    semantic_query_batch_window_ms: int = 5  # Max wait for concurrent queries to join
     max_feedback_corrections: int = 3
+    long_term_cache_size: int = 10000  # Cached user profiles per worker
+    long_term_cache_ttl_seconds: int = 3600
     
     # Observability
     enable_metrics: bool = True
     enable_tracing: bool = True
     log_level: str = "INFO"
+    trace_sink_batch_size: int = 100  # Observability rows per INSERT batch
+    trace_sink_interval_ms: int = 200  # Max delay before queued rows are written
     
     # CORS
     cors_origins: str = "http://localhost:3000,http://localhost:5173"
     
-    class Config:
-        env_file = ".env"
-        case_sensitive = False
+    @property
+    def database_url_sync(self) -> str:
+        """Database URL with the legacy postgres:// scheme normalized for SQLAlchemy."""
+        scheme, sep, rest = self.database_url.partition("://")
+        return f"{'postgresql' if scheme == 'postgres' else scheme}{sep}{rest}"
+    
+    @property
+    def database_url_async(self) -> str:
+        """Database URL using the async driver (aiosqlite / asyncpg)."""
+        scheme, sep, rest = self.database_url.partition("://")
+        async_schemes = {
+            "sqlite": "sqlite+aiosqlite",
+            "sqlite+pysqlite": "sqlite+aiosqlite",
+            "postgres": "postgresql+asyncpg",
+            "postgresql": "postgresql+asyncpg",
+            "postgresql+psycopg2": "postgresql+asyncpg",
+        }
+        return f"{async_schemes.get(scheme, scheme)}{sep}{rest}"
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        case_sensitive=False,
+        frozen=True
+    )
+
+
+@lru_cache
+def get_settings() -> Settings:
+    """Get the process-wide settings (usable as a FastAPI dependency)."""
+    return Settings()
 
 
 # Global settings instance
-settings = Settings()
+settings = get_settings()
@@ -1,16 +1,22 @@
-import uuid
-from typing import Dict, Any
-from sqlalchemy.orm import Session
+import asyncio
+import re
+from uuid import uuid4
+from typing import AsyncIterator, Dict, Any, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.memory.manager import MemoryManager
 from app.core.prompt_builder import prompt_builder
 from app.core.token_manager import token_manager
 from app.services.llm_service import llm_service
-from app.models.database import Conversation, RequestTrace
+from app.models.database import Conversation, RequestTrace, RequestTraceDetail
 from app.observability.logger import get_logger
+from app.observability.sink import trace_sink
 import time
 
 logger = get_logger(__name__)
 
+# Manual feedback trigger, e.g. "Incorrect: the capital is Canberra"
+_FEEDBACK_RE = re.compile(r"^\s*incorrect:", re.IGNORECASE)
+
 
 class ChatOrchestrator:
     """Main orchestrator for chat processing."""
@@ -23,7 +29,7 @@ class ChatOrchestrator:
         user_id: str,
         user_message: str,
         conversation_id: str = None,
-        db: Session = None
+        db: AsyncSession = None
     ) -> Dict[str, Any]:
         """
         Process user message through complete pipeline.
@@ -37,199 +43,371 @@ class ChatOrchestrator:
         Returns:
             Response with observability data
         """
-        start_time = time.time()
-        request_id = str(uuid.uuid4())
-        
-        logger.info(f"Processing message for user: {user_id}, request: {request_id}")
-        
         try:
-            # Create or get conversation
-            if not conversation_id:
-                conversation_id = str(uuid.uuid4())
-                conversation = Conversation(
-                    conversation_id=conversation_id,
-                    user_id=user_id,
-                    title=user_message[:100]  # Use first 100 chars as title
-                )
-                db.add(conversation)
-                db.commit()
-                logger.info(f"Created new conversation: {conversation_id}")
-            
-            # Step 1: Generate embedding for user message
-            query_embedding = await llm_service.generate_embedding(user_message)
-            
-            # Step 2: Retrieve all memories in parallel
-            retrieval_start = time.time()
-            memory_snapshot = await self.memory_manager.retrieve_all_memories(
-                user_id=user_id,
-                conversation_id=conversation_id,
-                query=user_message,
-                query_embedding=query_embedding,
-                db=db
-            )
-            retrieval_latency = (time.time() - retrieval_start) * 1000
-
-            # Step 2.5: Detect manual feedback trigger
-            feedback_added = False
-            if user_message.lower().strip().startswith("incorrect:"):
-                try:
-                    feedback_id = str(uuid.uuid4())
-                    await self.memory_manager.feedback.store(
-                        feedback_id=feedback_id,
-                        user_id=user_id,
-                        conversation_id=conversation_id,
-                        message_id=request_id,
-                        correction_type="manual_user_correction",
-                        user_correction=user_message,
-                        corrected_response=None,
-                        context_snapshot={
-                            "short_term": len(memory_snapshot["short_term_memory"]["messages"]),
-                            "has_long_term": bool(memory_snapshot["long_term_memory"])
-                        },
-                        db=db
-                    )
-                    logger.info(f"Captured manual feedback: {feedback_id}")
-                    feedback_added = True
-                    # Refresh feedback memory snapshot immediately
-                    memory_snapshot["feedback_memory"] = await self.memory_manager.feedback.retrieve(
-                        user_id=user_id, db=db, current_context=user_message
-                    )
-                except Exception as fe:
-                    logger.error(f"Failed to capture manual feedback: {fe}")
-
-            # Step 3: Build optimized prompt
-            prompt_start = time.time()
-            final_prompt, token_breakdown = prompt_builder.build_prompt(
-                memory_snapshot=memory_snapshot,
-                user_message=user_message
-            )
-            prompt_latency = (time.time() - prompt_start) * 1000
+            turn = await self._prepare_turn(user_id, user_message, conversation_id, db)
             
             # Step 4: Generate response from LLM
             llm_start = time.time()
             llm_response = await llm_service.generate(
-                prompt=final_prompt,
+                prompt=turn["prompt"],
                 max_tokens=1000,
-                temperature=0.7
+                temperature=0.7,
+                system_prompt=turn["system_prompt"]
             )
-            assistant_response = llm_response["response"]
-            llm_latency = (time.time() - llm_start) * 1000
+            turn["llm_latency"] = (time.time() - llm_start) * 1000
             
-            # Step 5-8: Storage operations
-            storage_start = time.time()
-            # Step 5: Store user message
-            user_message_id = str(uuid.uuid4())
-            user_embedding = query_embedding
+            return await self._complete_turn(turn, llm_response, db)
+        
+        except Exception as e:
+            logger.error(f"Error in process_message pipeline: {e}", exc_info=True)
+            await db.rollback()
+            raise
+    
+    async def process_message_stream(
+        self,
+        user_id: str,
+        user_message: str,
+        conversation_id: str = None,
+        db: AsyncSession = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process user message, streaming the LLM response as it is generated.
+        
+        Args:
+            user_id: User identifier
+            user_message: User's message
+            conversation_id: Conversation ID (creates new if None)
+            db: Database session
             
-            await self.memory_manager.store_message(
-                user_id=user_id,
-                conversation_id=conversation_id,
-                message_id=user_message_id,
-                content=user_message,
-                role="user",
-                embedding=user_embedding,
-                metadata={
-                    "tokens": token_manager.count_tokens(user_message),
-                    "conversation_title": user_message[:100]
-                },
-                db=db
-            )
+        Yields:
+            Events as {"event": ..., "data": ...}: one "start" with the
+            request and conversation IDs, a "token" per text delta, and a
+            final "done" carrying the same payload process_message returns
+        """
+        try:
+            turn = await self._prepare_turn(user_id, user_message, conversation_id, db)
+            yield {
+                "event": "start",
+                "data": {
+                    "request_id": turn["request_id"],
+                    "conversation_id": turn["conversation_id"]
+                }
+            }
             
-            # Step 6: Store assistant response
-            assistant_message_id = str(uuid.uuid4())
-            assistant_embedding = await llm_service.generate_embedding(assistant_response)
+            # Step 4: Stream response from LLM
+            llm_start = time.time()
+            usage: Dict[str, Any] = {}
+            parts = []
+            async for text in llm_service.generate_stream(
+                prompt=turn["prompt"],
+                max_tokens=1000,
+                temperature=0.7,
+                system_prompt=turn["system_prompt"],
+                usage=usage
+            ):
+                parts.append(text)
+                yield {"event": "token", "data": text}
+            llm_response = {"response": "".join(parts), **usage}
+            turn["llm_latency"] = (time.time() - llm_start) * 1000
+            
+            yield {"event": "done", "data": await self._complete_turn(turn, llm_response, db)}
+        
+        except Exception as e:
+            logger.error(f"Error in process_message_stream pipeline: {e}", exc_info=True)
+            await db.rollback()
+            raise
+    
+    async def _prepare_turn(
+        self,
+        user_id: str,
+        user_message: str,
+        conversation_id: Optional[str],
+        db: AsyncSession
+    ) -> Dict[str, Any]:
+        """
+        Run the pipeline up to the LLM call (Steps 1-3).
+        
+        Args:
+            user_id: User identifier
+            user_message: User's message
+            conversation_id: Conversation ID (creates new if None)
+            db: Database session
             
-            await self.memory_manager.store_message(
+        Returns:
+            Turn state consumed by _complete_turn, including the split prompt
+        """
+        start_time = time.time()
+        request_id = uuid4().hex
+        title = user_message[:100]  # Use first 100 chars as title
+        
+        logger.info(f"Processing message for user: {user_id}, request: {request_id}")
+        
+        # Step 1: Create or get conversation, then embed the user message
+        conversation_id = await self._ensure_conversation(db, conversation_id, user_id, title)
+        query_embedding = await llm_service.generate_embedding(user_message)
+        
+        # Step 2: Retrieve all memories in parallel
+        retrieval_start = time.time()
+        memory_snapshot = await self.memory_manager.retrieve_all_memories_cached(
+            user_id=user_id,
+            conversation_id=conversation_id,
+            query=user_message,
+            query_embedding=query_embedding,
+            db=db
+        )
+        retrieval_latency = (time.time() - retrieval_start) * 1000
+
+        # Step 2.5: Detect manual feedback trigger. The correction is part
+        # of this request's unit of work: a failed flush fails the turn
+        # rather than leaving the session half-written.
+        if _FEEDBACK_RE.match(user_message):
+            feedback_id = uuid4().hex
+            await self.memory_manager.feedback.store(
+                feedback_id=feedback_id,
                 user_id=user_id,
                 conversation_id=conversation_id,
-                message_id=assistant_message_id,
-                content=assistant_response,
-                role="assistant",
-                embedding=assistant_embedding,
-                metadata={
-                    "tokens": llm_response["completion_tokens"],
-                    "conversation_title": user_message[:100]
+                message_id=request_id,
+                correction_type="manual_user_correction",
+                user_correction=user_message,
+                corrected_response=None,
+                context_snapshot={
+                    "short_term": len(memory_snapshot["short_term_memory"]["messages"]),
+                    "has_long_term": bool(memory_snapshot["long_term_memory"])
                 },
                 db=db
             )
-            
-            # Step 7: Calculate metrics
-            latency_ms = (time.time() - start_time) * 1000
-            cost = token_manager.calculate_cost(
-                llm_response["prompt_tokens"],
-                llm_response["completion_tokens"],
-                llm_response["model"]
+            logger.info(f"Captured manual feedback: {feedback_id}")
+            # Refresh feedback memory snapshot immediately
+            memory_snapshot["feedback_memory"] = await self.memory_manager.feedback.retrieve(
+                user_id=user_id, db=db, current_context=user_message
             )
+
+        # Step 3: Build optimized prompt
+        prompt_start = time.time()
+        # CPU-bound tokenization runs off the event loop
+        final_prompt, token_breakdown = await asyncio.to_thread(
+            prompt_builder.build_prompt,
+            memory_snapshot=memory_snapshot,
+            user_message=user_message
+        )
+        # The static system layer goes out as its own (provider-cached) message
+        system_prompt, prompt = prompt_builder.split_system_prompt(final_prompt)
+        prompt_latency = (time.time() - prompt_start) * 1000
+        
+        return {
+            "start_time": start_time,
+            "request_id": request_id,
+            "user_id": user_id,
+            "user_message": user_message,
+            "conversation_id": conversation_id,
+            "title": title,
+            "query_embedding": query_embedding,
+            "memory_snapshot": memory_snapshot,
+            "system_prompt": system_prompt,
+            "prompt": prompt,
+            "token_breakdown": token_breakdown,
+            "retrieval_latency": retrieval_latency,
+            "prompt_latency": prompt_latency
+        }
+    
+    async def _complete_turn(
+        self,
+        turn: Dict[str, Any],
+        llm_response: Dict[str, Any],
+        db: AsyncSession
+    ) -> Dict[str, Any]:
+        """
+        Store the turn and build the response payload (Steps 5-9).
+        
+        Args:
+            turn: State returned by _prepare_turn, plus "llm_latency"
+            llm_response: generate() result (response text and usage)
+            db: Database session
             
-            # Step 8: Store request trace
-            trace = RequestTrace(
-                request_id=request_id,
-                user_id=user_id,
-                conversation_id=conversation_id,
-                user_message=user_message,
-                assistant_response=assistant_response,
-                prompt_tokens=llm_response["prompt_tokens"],
-                completion_tokens=llm_response["completion_tokens"],
-                total_tokens=llm_response["total_tokens"],
-                latency_ms=latency_ms,
-                llm_provider=llm_response["provider"],
-                model_name=llm_response["model"],
-                memory_snapshot=memory_snapshot
-            )
-            db.add(trace)
-            db.commit()
-            storage_latency = (time.time() - storage_start) * 1000
-            
-            # Step 8.5: Final refresh of all memories for the observability snapshot
-            memory_snapshot = await self.memory_manager.retrieve_all_memories(
-                user_id=user_id,
-                conversation_id=conversation_id,
-                query=user_message,
-                query_embedding=query_embedding,
-                db=db
+        Returns:
+            Response with observability data
+        """
+        request_id = turn["request_id"]
+        user_id = turn["user_id"]
+        user_message = turn["user_message"]
+        conversation_id = turn["conversation_id"]
+        title = turn["title"]
+        memory_snapshot = turn["memory_snapshot"]
+        assistant_response = llm_response["response"]
+        
+        # Step 5-8: Storage operations
+        storage_start = time.time()
+        # Step 5: Stage user message
+        user_message_id, assistant_message_id = uuid4().hex, uuid4().hex
+        user_embedding = turn["query_embedding"]
+        user_message_tokens = await asyncio.to_thread(
+            token_manager.count_tokens, user_message
+        )
+        
+        staged_user_message = self.memory_manager.stage_message(
+            user_id=user_id,
+            conversation_id=conversation_id,
+            message_id=user_message_id,
+            content=user_message,
+            role="user",
+            embedding=user_embedding,
+            metadata={
+                "tokens": user_message_tokens,
+                "conversation_title": title
+            },
+            db=db
+        )
+        
+        # Step 6: Stage assistant response
+        assistant_embedding = await llm_service.generate_embedding(assistant_response)
+        staged_assistant_message = self.memory_manager.stage_message(
+            user_id=user_id,
+            conversation_id=conversation_id,
+            message_id=assistant_message_id,
+            content=assistant_response,
+            role="assistant",
+            embedding=assistant_embedding,
+            metadata={
+                "tokens": llm_response["completion_tokens"],
+                "conversation_title": title
+            },
+            db=db
+        )
+        
+        # Step 7: Calculate metrics
+        latency_ms = (time.time() - turn["start_time"]) * 1000
+        cost = token_manager.calculate_cost(
+            llm_response["prompt_tokens"],
+            llm_response["completion_tokens"],
+            llm_response["model"]
+        )
+        
+        # Step 8: Commit the whole unit of work; the request trace is
+        # written asynchronously by the trace sink
+        await db.commit()
+        # Caches and the vector store only see the turn once it is durable
+        stored_user_message, stored_assistant_message = (
+            await self.memory_manager.publish_messages(
+                [staged_user_message, staged_assistant_message]
             )
+        )
+        trace_sink.record(RequestTrace, {
+            "request_id": request_id,
+            "user_id": user_id,
+            "conversation_id": conversation_id,
+            "user_message": user_message,
+            "assistant_response": assistant_response,
+            "prompt_tokens": llm_response["prompt_tokens"],
+            "completion_tokens": llm_response["completion_tokens"],
+            "total_tokens": llm_response["total_tokens"],
+            "latency_ms": latency_ms,
+            "llm_provider": llm_response["provider"],
+            "model_name": llm_response["model"],
+            "memory_snapshot": self._summarize_snapshot(memory_snapshot)
+        })
+        trace_sink.record(RequestTraceDetail, {
+            "request_id": request_id,
+            "memory_snapshot": memory_snapshot
+        })
+        storage_latency = (time.time() - storage_start) * 1000
+        
+        # Step 8.5: Append this turn to the snapshot instead of re-retrieving
+        # (feedback memory was already refreshed in Step 2.5 if needed).
+        # Copied so the snapshot persisted for the trace is left untouched.
+        short_term_memory = memory_snapshot["short_term_memory"]
+        memory_snapshot = {
+            **memory_snapshot,
+            "short_term_memory": {
+                **short_term_memory,
+                "messages": short_term_memory["messages"] + [
+                    stored_user_message, stored_assistant_message
+                ]
+            }
+        }
 
-            # Step 9: Build observability data
-            observability_data = {
-                "request_id": request_id,
-                "short_term_memory": memory_snapshot["short_term_memory"],
-                "long_term_memory": memory_snapshot["long_term_memory"],
-                "semantic_memory": memory_snapshot["semantic_memory"],
-                "feedback_memory": memory_snapshot["feedback_memory"],
-                "token_usage": {
-                    "breakdown": token_breakdown,
-                    "total": llm_response["prompt_tokens"],
-                    "estimated_response": llm_response["completion_tokens"],
-                    "cost": cost
-                },
-                "request_trace": {
-                    "steps": [
-                        {"name": "Memory Retrieval", "latency_ms": retrieval_latency},
-                        {"name": "Prompt Construction", "latency_ms": prompt_latency},
-                        {"name": "LLM Call", "latency_ms": llm_latency},
-                        {"name": "Storage / Trace", "latency_ms": storage_latency}
-                    ],
-                    "total_latency_ms": latency_ms
-                }
+        # Step 9: Build observability data
+        observability_data = {
+            "request_id": request_id,
+            "short_term_memory": memory_snapshot["short_term_memory"],
+            "long_term_memory": memory_snapshot["long_term_memory"],
+            "semantic_memory": memory_snapshot["semantic_memory"],
+            "feedback_memory": self.memory_manager.feedback.to_rows(
+                memory_snapshot["feedback_memory"]
+            ),
+            "token_usage": {
+                "breakdown": turn["token_breakdown"],
+                "total": llm_response["prompt_tokens"],
+                "estimated_response": llm_response["completion_tokens"],
+                "cost": cost
+            },
+            "request_trace": {
+                "steps": [
+                    {"name": "Memory Retrieval", "latency_ms": turn["retrieval_latency"]},
+                    {"name": "Prompt Construction", "latency_ms": turn["prompt_latency"]},
+                    {"name": "LLM Call", "latency_ms": turn["llm_latency"]},
+                    {"name": "Storage / Trace", "latency_ms": storage_latency}
+                ],
+                "total_latency_ms": latency_ms
             }
+        }
+        
+        logger.info(
+            f"Completed request {request_id}: "
+            f"{llm_response['total_tokens']} tokens, "
+            f"${cost:.6f}, {latency_ms:.0f}ms"
+        )
+        
+        return {
+            "response": assistant_response,
+            "conversation_id": conversation_id,
+            "message_id": assistant_message_id,
+            "observability": observability_data
+        }
+    
+    async def _ensure_conversation(
+        self,
+        db: AsyncSession,
+        conversation_id: Optional[str],
+        user_id: str,
+        title: str
+    ) -> str:
+        """
+        Create a conversation if none was given.
+        
+        Args:
+            db: Database session
+            conversation_id: Existing conversation ID, or None
+            user_id: User identifier
+            title: Title for a new conversation
             
-            logger.info(
-                f"Completed request {request_id}: "
-                f"{llm_response['total_tokens']} tokens, "
-                f"${cost:.6f}, {latency_ms:.0f}ms"
-            )
-            
-            return {
-                "response": assistant_response,
-                "conversation_id": conversation_id,
-                "message_id": assistant_message_id,
-                "observability": observability_data
-            }
+        Returns:
+            Conversation ID
+        """
+        if conversation_id:
+            return conversation_id
         
-        except Exception as e:
-            logger.error(f"Error in process_message pipeline: {e}", exc_info=True)
-            db.rollback()
-            raise
+        conversation_id = uuid4().hex
+        conversation = Conversation(
+            conversation_id=conversation_id,
+            user_id=user_id,
+            title=title
+        )
+        db.add(conversation)  # Committed with the rest of the request
+        logger.info(f"Created new conversation: {conversation_id}")
+        
+        return conversation_id
+    
+    @staticmethod
+    def _summarize_snapshot(memory_snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the compact projection of a memory snapshot stored on RequestTrace."""
+        return {
+            "short_term_count": len(memory_snapshot["short_term_memory"]["messages"]),
+            "semantic_ids": [
+                m.id for m in memory_snapshot["semantic_memory"]["relevant_memories"]
+            ],
+            "feedback_ids": list(memory_snapshot["feedback_memory"]["ids"]),
+            "has_long_term": bool(memory_snapshot["long_term_memory"])
+        }
 
 
 # Global orchestrator instance
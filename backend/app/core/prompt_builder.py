@@ -5,6 +5,9 @@ from app.observability.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Prompt token budget, fixed for the life of the (frozen) settings
+AVAILABLE_TOKENS = settings.max_context_window - settings.response_buffer_tokens
+
 
 class PromptBuilder:
     """Prompt construction with layered architecture."""
@@ -30,6 +33,23 @@ class PromptBuilder:
         "current_message": 200
     }
     
+    ROLE_LABELS = {"user": "User", "assistant": "Assistant"}
+    
+    # Static system layer, built and counted once at import
+    SYSTEM_INSTRUCTIONS = """You are a helpful AI assistant with persistent memory.
+
+Key capabilities:
+- You remember user preferences and past conversations
+- You learn from corrections and feedback
+- You provide context-aware responses
+
+Important guidelines:
+- If you're unsure, say so
+- Reference past conversations when relevant
+- Acknowledge when you've been corrected before"""
+    
+    SYSTEM_INSTRUCTIONS_TOKENS = token_manager.count_tokens(SYSTEM_INSTRUCTIONS)
+    
     def build_prompt(
         self,
         memory_snapshot: Dict[str, Any],
@@ -88,19 +108,27 @@ class PromptBuilder:
         
         return optimized_prompt, token_breakdown
     
+    def split_system_prompt(self, prompt: str) -> tuple[str, str]:
+        """
+        Split a built prompt into its system layer and the rest.
+        
+        The system layer is static and always first, so sending it as a
+        separate system message lets providers cache its prefill.
+        
+        Args:
+            prompt: Prompt returned by build_prompt
+            
+        Returns:
+            Tuple of (system instructions, remaining prompt)
+        """
+        if not prompt.startswith(self.SYSTEM_INSTRUCTIONS):
+            return "", prompt
+        
+        return self.SYSTEM_INSTRUCTIONS, prompt[len(self.SYSTEM_INSTRUCTIONS):].lstrip("\n")
+    
     def _build_system_layer(self) -> str:
         """Build system instructions layer."""
-        return """You are a helpful AI assistant with persistent memory.
-
-Key capabilities:
-- You remember user preferences and past conversations
-- You learn from corrections and feedback
-- You provide context-aware responses
-
-Important guidelines:
-- If you're unsure, say so
-- Reference past conversations when relevant
-- Acknowledge when you've been corrected before"""
+        return self.SYSTEM_INSTRUCTIONS
     
     def _build_profile_layer(self, profile: Dict[str, Any]) -> str:
         """Build user profile layer."""
@@ -120,18 +148,22 @@ Important guidelines:
     
     def _build_feedback_layer(self, feedback_memory: Dict[str, Any]) -> str:
         """Build feedback corrections layer."""
-        corrections = feedback_memory.get("corrections", [])
+        user_corrections = feedback_memory.get("user_corrections", [])
         
-        if not corrections:
+        if not user_corrections:
             return ""
         
-        feedback_text = "\n\n## Past Corrections (Learn from these)"
-        for correction in corrections[:3]:  # Top 3
-            feedback_text += f"""
-- Previous mistake: {correction.get('user_correction', '')}
-- Correct approach: {correction.get('corrected_response', 'N/A')}"""
+        parts = ["\n\n## Past Corrections (Learn from these)"]
+        parts.extend(
+            f"- Previous mistake: {user_correction}\n"
+            f"- Correct approach: {corrected_response}"
+            for user_correction, corrected_response in zip(
+                user_corrections[:3],  # Top 3
+                feedback_memory.get("corrected_responses", [])
+            )
+        )
         
-        return feedback_text
+        return "\n".join(parts)
     
     def _build_summary_layer(self, summary: Dict[str, Any]) -> str:
         """Build conversation summary layer."""
@@ -151,17 +183,15 @@ Important guidelines:
         if not memories:
             return ""
         
-        context_text = "\n\n## Relevant Past Conversations"
-        for memory in memories[:3]:  # Top 3
-            metadata = memory.get("metadata", {})
-            score = memory.get("similarity_score", 0)
-            content = memory.get("content", "")[:200]  # Truncate
-            
-            context_text += f"""
-- [{metadata.get('conversation_title', 'Untitled')}] (Similarity: {score:.2f})
-  {content}..."""
+        parts = ["\n\n## Relevant Past Conversations"]
+        for memory in memories[:3]:  # Top 3 SemanticHits
+            title = (memory.metadata or {}).get("conversation_title", "Untitled")
+            content = memory.content[:200]  # Truncate
+            parts.append(
+                f"- [{title}] (Similarity: {memory.similarity_score:.2f})\n  {content}..."
+            )
         
-        return context_text
+        return "\n".join(parts)
     
     def _build_recent_messages_layer(self, short_term_memory: Dict[str, Any]) -> str:
         """Build recent messages layer."""
@@ -170,13 +200,14 @@ Important guidelines:
         if not messages:
             return ""
         
-        messages_text = "\n\n## Recent Conversation"
-        for msg in messages[-10:]:  # Last 10
-            role = "User" if msg.get("role") == "user" else "Assistant"
-            content = msg.get("content", "")
-            messages_text += f"\n{role}: {content}\n"
+        role_labels = self.ROLE_LABELS
+        parts = ["\n\n## Recent Conversation"]
+        parts.extend(
+            f"{role_labels.get(msg.get('role'), 'Assistant')}: {msg.get('content', '')}\n"
+            for msg in messages[-10:]  # Last 10
+        )
         
-        return messages_text
+        return "\n".join(parts)
     
     def _optimize_layers(self, layers: Dict[str, str]) -> tuple[str, Dict[str, int]]:
         """
@@ -189,16 +220,25 @@ Important guidelines:
             Tuple of (Optimized prompt string, layer_token_counts)
         """
         # Calculate current token usage
+        # Empty layers (common for new users / conversations) are never tokenized
         layer_tokens = {
-            name: token_manager.count_tokens(content)
+            name: (
+                self.SYSTEM_INSTRUCTIONS_TOKENS
+                if name == "system_instructions"
+                else token_manager.count_tokens(content) if content else 0
+            )
             for name, content in layers.items()
         }
         
         total_tokens = sum(layer_tokens.values())
-        available_tokens = settings.max_context_window - settings.response_buffer_tokens
-        
-        if total_tokens <= available_tokens:
-            # No optimization needed
+        available_tokens = AVAILABLE_TOKENS
+        
+        if total_tokens <= available_tokens or all(
+            tokens <= self.TOKEN_ALLOCATION.get(name, tokens)
+            for name, tokens in layer_tokens.items()
+        ):
+            # No optimization needed (or possible: trimming only shrinks
+            # layers that exceed their allocation)
             return self._assemble_prompt(layers), layer_tokens
         
         logger.warning(
@@ -208,6 +248,7 @@ Important guidelines:
         
         # Trim layers based on priority (semantic first, then summary, etc.)
         trimmed_layers = layers.copy()
+        final_tokens = layer_tokens.copy()
         
         # Trim semantic context
         if layer_tokens.get("semantic_context", 0) > self.TOKEN_ALLOCATION["semantic_context"]:
@@ -215,25 +256,21 @@ Important guidelines:
                 layers["semantic_context"],
                 self.TOKEN_ALLOCATION["semantic_context"]
             )
+            final_tokens["semantic_context"] = token_manager.count_tokens(
+                trimmed_layers["semantic_context"]
+            )
         
         # Trim recent messages if still over budget
-        total_after_trim = sum(
-            token_manager.count_tokens(content)
-            for content in trimmed_layers.values()
-        )
-        
-        if total_after_trim > available_tokens:
+        if sum(final_tokens.values()) > available_tokens:
             trimmed_layers["recent_messages"] = token_manager.truncate(
                 layers["recent_messages"],
                 self.TOKEN_ALLOCATION["recent_messages"]
             )
+            final_tokens["recent_messages"] = token_manager.count_tokens(
+                trimmed_layers["recent_messages"]
+            )
         
-        # Recalculate token counts for trimmed layers
-        final_tokens = {
-            name: token_manager.count_tokens(content)
-            for name, content in trimmed_layers.items()
-        }
-        
+        # Untrimmed layers carry their original counts forward
         return self._assemble_prompt(trimmed_layers), final_tokens
     
     def _assemble_prompt(self, layers: Dict[str, str]) -> str:
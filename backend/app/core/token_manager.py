@@ -1,42 +1,118 @@
+import os
 import tiktoken
-from typing import Dict, Any
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Any, List
 from app.config import settings
 from app.observability.logger import get_logger
 
 logger = get_logger(__name__)
 
+# (input, output) USD per token, i.e. per-1K pricing (as of 2024) / 1000
+PRICING_PER_TOKEN = MappingProxyType({
+    "gpt-4": (0.03 / 1000, 0.06 / 1000),
+    "gpt-3.5-turbo": (0.0015 / 1000, 0.002 / 1000),
+    "claude-3-opus-20240229": (0.015 / 1000, 0.075 / 1000)
+})
+
+# Upper bound on characters per token used to size the prefix truncate() encodes
+TRUNCATE_CHARS_PER_TOKEN = 8
+
+# Below this many texts, count_tokens_batch counts serially: tiktoken's batch
+# call starts a fresh thread pool each time and bypasses the count memo
+BATCH_COUNT_MIN_TEXTS = 16
+
+# Context window (prompt + completion tokens) per model; others use max_context_window
+CONTEXT_WINDOW_TOKENS = MappingProxyType({
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "llama-3.3-70b-versatile": 131072,
+    "claude-3-opus-20240229": 200000
+})
+
+# Headroom for the chat formatting tokens providers wrap around the prompt
+CHAT_FORMAT_OVERHEAD_TOKENS = 16
+
+
+@lru_cache(maxsize=4)
+def _get_encoder(model: str) -> tiktoken.Encoding:
+    """Load the tiktoken encoder for a model once per process."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@lru_cache(maxsize=4096)
+def _count_cached(encoder: tiktoken.Encoding, text: str) -> int:
+    """Count tokens for text, memoized per (encoder, text)."""
+    # encode_ordinary skips the special-token scan; counts only need length
+    return len(encoder.encode_ordinary(text))
+
 
 class TokenManager:
     """Token counting and optimization manager."""
     
     def __init__(self):
-        # Initialize tiktoken encoder
-        try:
-            self.encoder = tiktoken.encoding_for_model("gpt-4")
-        except:
-            self.encoder = tiktoken.get_encoding("cl100k_base")
+        # Initialize tiktoken encoder (shared across instances)
+        self.encoder = _get_encoder("gpt-4")
         
         self.max_context_window = settings.max_context_window
         self.response_buffer = settings.response_buffer_tokens
     
+    @classmethod
+    @lru_cache(maxsize=1)
+    def instance(cls) -> "TokenManager":
+        """Get the process-wide TokenManager (use instead of constructing one)."""
+        return cls()
+    
     def count_tokens(self, text: str) -> int:
         """
         Count tokens in text.
         
+        Results are memoized per (encoder, text), so repeated strings
+        (summaries, corrections, profile text) are only encoded once.
+        
         Args:
             text: Input text
             
         Returns:
             Token count
         """
+        if not text:
+            return 0
+        
         try:
-            tokens = self.encoder.encode(text)
-            return len(tokens)
+            return _count_cached(self.encoder, text)
         except Exception as e:
             logger.error(f"Error counting tokens: {e}")
             # Fallback: rough estimate (1 token ≈ 4 characters)
             return len(text) // 4
     
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        """
+        Count tokens for many texts in one batched tiktoken call.
+        
+        Small batches are counted one by one through the count_tokens memo.
+        
+        Args:
+            texts: Input texts
+            
+        Returns:
+            Token count per text
+        """
+        if len(texts) < BATCH_COUNT_MIN_TEXTS:
+            return [self.count_tokens(text) for text in texts]
+        
+        try:
+            encoded = self.encoder.encode_ordinary_batch(
+                texts, num_threads=min(len(texts), os.cpu_count() or 1)
+            )
+            return [len(tokens) for tokens in encoded]
+        except Exception as e:
+            logger.error(f"Error batch counting tokens: {e}")
+            return [self.count_tokens(text) for text in texts]
+    
     def truncate(self, text: str, max_tokens: int) -> str:
         """
         Truncate text to maximum token count.
@@ -48,8 +124,20 @@ class TokenManager:
         Returns:
             Truncated text
         """
+        # Every token covers at least one UTF-8 byte, so short text always fits
+        if len(text) <= max_tokens and len(text.encode("utf-8")) <= max_tokens:
+            return text
+        
         try:
-            tokens = self.encoder.encode(text)
+            # Only encode a prefix that clearly covers the budget; anything past it
+            # would be discarded anyway (only the cut BPE piece can differ)
+            prefix_chars = max_tokens * TRUNCATE_CHARS_PER_TOKEN
+            if len(text) > prefix_chars:
+                tokens = self.encoder.encode_ordinary(text[:prefix_chars])
+                if len(tokens) > max_tokens:
+                    return self.encoder.decode(tokens[:max_tokens])
+            
+            tokens = self.encoder.encode_ordinary(text)
             
             if len(tokens) <= max_tokens:
                 return text
@@ -73,33 +161,74 @@ class TokenManager:
         Returns:
             Estimated token count
         """
-        total_tokens = 0
+        total_tokens: int = 0
+        texts: List[str] = []  # Counted together in one batched call
         
-        # Count short-term memory tokens
-        stm = memory_snapshot.get("short_term_memory", {})
+        # Count short-term memory tokens (precomputed per message)
+        stm: Dict[str, Any] = memory_snapshot.get("short_term_memory", {})
         for msg in stm.get("messages", []):
             total_tokens += msg.get("tokens", 0)
         
-        # Count summary tokens
+        # Collect summary text
         if stm.get("summary"):
-            summary_text = stm["summary"].get("text", "")
-            total_tokens += self.count_tokens(summary_text)
+            texts.append(stm["summary"].get("text", ""))
         
         # Estimate other memory types (rough approximation)
         ltm = memory_snapshot.get("long_term_memory", {})
         if ltm:
             total_tokens += 200  # Approximate profile size
         
-        sem = memory_snapshot.get("semantic_memory", {})
+        # Semantic memories and corrections carry counts computed at write
+        # time; only records stored before that are re-encoded
+        sem: Dict[str, Any] = memory_snapshot.get("semantic_memory", {})
         for memory in sem.get("relevant_memories", []):
-            total_tokens += self.count_tokens(memory.get("content", ""))
+            token_count = (memory.metadata or {}).get("token_count")
+            if token_count is None:
+                texts.append(memory.content)
+            else:
+                total_tokens += token_count
+        
+        fbm: Dict[str, Any] = memory_snapshot.get("feedback_memory", {})
+        for user_correction, token_count in zip(
+            fbm.get("user_corrections", []), fbm.get("token_counts", [])
+        ):
+            if token_count is None:
+                texts.append(user_correction or "")
+            else:
+                total_tokens += token_count
         
-        fbm = memory_snapshot.get("feedback_memory", {})
-        for correction in fbm.get("corrections", []):
-            total_tokens += self.count_tokens(correction.get("user_correction", ""))
+        total_tokens += sum(self.count_tokens_batch(texts))
         
         return total_tokens
     
+    def max_completion_tokens(self, prompt: str, max_tokens: int, model: str) -> int:
+        """
+        Cap max_tokens to what fits in the model's context window after the prompt.
+        
+        Args:
+            prompt: Prompt about to be sent
+            max_tokens: Requested completion budget
+            model: Model name
+            
+        Returns:
+            Completion budget the provider will accept
+            
+        Raises:
+            ValueError: If the prompt alone fills the context window
+        """
+        window = CONTEXT_WINDOW_TOKENS.get(model, self.max_context_window)
+        # Prompts are unique per request: encode directly rather than
+        # filling the count memo with one-off strings
+        prompt_tokens = len(self.encoder.encode_ordinary(prompt))
+        available = window - prompt_tokens - CHAT_FORMAT_OVERHEAD_TOKENS
+        
+        if available <= 0:
+            raise ValueError(
+                f"Prompt of {prompt_tokens} tokens exceeds the {window}-token context window of {model}"
+            )
+        
+        return min(max_tokens, available)
+    
     def calculate_cost(
         self,
         prompt_tokens: int,
@@ -117,22 +246,12 @@ class TokenManager:
         Returns:
             Cost in USD
         """
-        # Pricing per 1K tokens (as of 2024)
-        pricing = {
-            "gpt-4": {"input": 0.03, "output": 0.06},
-            "gpt-3.5-turbo": {"input": 0.0015, "output": 0.002},
-            "claude-3-opus-20240229": {"input": 0.015, "output": 0.075}
-        }
-        
-        model_pricing = pricing.get(model, pricing["gpt-4"])
+        input_rate, output_rate = PRICING_PER_TOKEN.get(model, PRICING_PER_TOKEN["gpt-4"])
         
-        cost = (
-            (prompt_tokens / 1000) * model_pricing["input"] +
-            (completion_tokens / 1000) * model_pricing["output"]
-        )
+        cost = prompt_tokens * input_rate + completion_tokens * output_rate
         
         return round(cost, 6)
 
 
 # Global token manager instance
-token_manager = TokenManager()
+token_manager = TokenManager.instance()
@@ -1,26 +1,91 @@
-from sqlalchemy import create_engine
+from contextvars import ContextVar
+import orjson
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from app.config import settings
+from app.observability.logger import get_logger
 
-# Create SQLAlchemy engine
+logger = get_logger(__name__)
+
+def _json_serializer(value) -> str:
+    """Serialize JSON columns with orjson (handles dataclasses, e.g. SemanticHit)."""
+    return orjson.dumps(value).decode()
+
+
+def _engine_options(url: str) -> dict:
+    """
+    Build pool and JSON column options for an engine on url.
+    
+    Pool sizing only applies to pooled server databases: SQLite engines use
+    NullPool / SingletonThreadPool, which reject those arguments.
+    """
+    options = {
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "json_serializer": _json_serializer,
+    }
+    
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+        )
+    
+    return options
+
+
+# Create SQLAlchemy engine (used for DDL and sync scripts)
 engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {},
-    echo=True if settings.environment == "development" else False
+    settings.database_url_sync,
+    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url_sync else {},
+    echo=settings.sql_echo,
+    **_engine_options(settings.database_url_sync)
 )
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Create async engine for request handling (aiosqlite / asyncpg)
+async_engine = create_async_engine(
+    settings.database_url_async,
+    # Disable Postgres JIT: it only adds planning latency for short OLTP queries
+    connect_args={"server_settings": {"jit": "off"}} if "asyncpg" in settings.database_url_async else {},
+    echo=settings.sql_echo,
+    **_engine_options(settings.database_url_async)
+)
+
+# Per-request SQL statement counter, used to spot N+1 query patterns
+query_count: ContextVar[int] = ContextVar("query_count", default=0)
+
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    query_count.set(query_count.get() + 1)
+
+
+# Create async session factory
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Create base class for models
 class Base(DeclarativeBase):
-    pass
+    # Fetch server-generated defaults (created_at, ...) at INSERT time so
+    # they never trigger an implicit lazy load under AsyncSession
+    __mapper_args__ = {"eager_defaults": True}
 
 
-def get_db():
-    """Dependency for getting database session."""
-    db = SessionLocal()
+async def get_async_db():
+    """Dependency for getting async database session."""
+    token = query_count.set(0)
     try:
-        yield db
+        async with AsyncSessionLocal() as db:
+            yield db
     finally:
-        db.close()
+        logger.debug(f"Request issued {query_count.get()} SQL statements")
+        query_count.reset(token)
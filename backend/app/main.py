@@ -1,6 +1,8 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 import logging
 
 from app.observability.logger import setup_logging
@@ -9,7 +11,9 @@ setup_logging()
 
 from app.config import settings
 from app.api.v1 import chat, memory, admin, auth, observability
-from app.db.session import engine, Base
+from app.db.session import engine, AsyncSessionLocal, Base
+from app.observability.sink import trace_sink
+from app.services.llm_service import http_client
 
 logger = logging.getLogger(__name__)
 
@@ -18,16 +22,29 @@ import os
 os.makedirs("data/chroma", exist_ok=True)
 os.makedirs("logs", exist_ok=True)
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown."""
+    # Ensure the demo user once instead of checking on every chat request
+    async with AsyncSessionLocal() as db:
+        await chat.ensure_user(db, chat.DEMO_USER_ID)
+    yield
+    # Write out any semantic memories and trace rows still queued
+    await chat.chat_orchestrator.memory_manager.close()
+    await trace_sink.close()
+    await http_client.aclose()
+
 
 # Initialize FastAPI app
 app = FastAPI(
+    lifespan=lifespan,
     title="MemoryChatAI",
     description="Production-Ready AI SaaS with Observable Memory System",
     version="0.1.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -40,6 +57,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class StreamAwareGZipMiddleware(GZipMiddleware):
+    """GZip that passes Server-Sent Event routes through uncompressed."""
+    
+    async def __call__(self, scope, receive, send):
+        # The gzip stream buffers small writes, which would hold back tokens
+        if scope["type"] == "http" and scope["path"].endswith("/stream"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+# Compress large observability payloads
+app.add_middleware(StreamAwareGZipMiddleware, minimum_size=1000)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["Authentication"])
 app.include_router(chat.router, prefix="/api/v1/chat", tags=["Chat"])
@@ -64,7 +95,8 @@ async def health_check():
     """Health check endpoint."""
     return {
         "status": "healthy",
-        "environment": settings.environment
+        "environment": settings.environment,
+        "semantic_dropped_writes": chat.chat_orchestrator.memory_manager.semantic.dropped_writes
     }
 
 
@@ -80,6 +112,8 @@ async def global_exception_handler(request, exc):
 
 if __name__ == "__main__":
     import uvicorn
+    # Create database tables once in the launcher; workers start DDL-free
+    Base.metadata.create_all(bind=engine)
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
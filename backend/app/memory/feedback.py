@@ -1,7 +1,10 @@
 from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.memory.base import BaseMemory
 from app.models.database import FeedbackCorrection
+from app.core.token_manager import token_manager
+from app.services.cache import invalidate_memory_cache
 from app.observability.logger import get_logger
 
 logger = get_logger(__name__)
@@ -13,7 +16,7 @@ class FeedbackMemory(BaseMemory):
     async def retrieve(
         self, 
         user_id: str,
-        db: Session,
+        db: AsyncSession,
         current_context: Optional[str] = None,
         limit: int = 3
     ) -> Dict[str, Any]:
@@ -27,37 +30,88 @@ class FeedbackMemory(BaseMemory):
             limit: Maximum number of corrections to retrieve
             
         Returns:
-            Dictionary with corrections and relevance scores
+            Dictionary of per-field lists (ids, user_corrections, ...)
         """
         logger.info(f"Retrieving feedback memory for user: {user_id}")
         
-        # Query recent corrections
-        corrections = db.query(FeedbackCorrection)\
-            .filter(FeedbackCorrection.user_id == user_id)\
-            .order_by(FeedbackCorrection.created_at.desc())\
-            .limit(limit * 2)\
-            .all()  # Get more than needed for filtering
+        # Query recent corrections as plain rows (no ORM hydration)
+        result = await db.execute(
+            select(
+                FeedbackCorrection.feedback_id,
+                FeedbackCorrection.correction_type,
+                FeedbackCorrection.user_correction,
+                FeedbackCorrection.corrected_response,
+                FeedbackCorrection.applied_count,
+                FeedbackCorrection.token_count,
+                FeedbackCorrection.created_at
+            )
+            .where(FeedbackCorrection.user_id == user_id)
+            .order_by(FeedbackCorrection.created_at.desc())
+            .limit(limit)
+        )
+        corrections = result.all()
         
-        if not corrections:
+        if corrections:
+            # Column-oriented result: one list per field instead of one dict per row
+            columns = [list(column) for column in zip(*corrections)]
+        else:
             logger.info(f"No feedback corrections found for user: {user_id}")
-            return {"corrections": []}
+            columns = [[] for _ in range(7)]
         
-        # Format corrections
-        correction_dicts = []
-        for correction in corrections[:limit]:
-            correction_dicts.append({
-                "id": correction.feedback_id,
-                "correction_type": correction.correction_type,
-                "user_correction": correction.user_correction,
-                "corrected_response": correction.corrected_response,
-                "application_count": correction.applied_count,
-                "relevance_score": 1.0,  # Default relevance (can be enhanced with embeddings)
-                "timestamp": correction.created_at.isoformat()
-            })
+        (
+            ids, correction_types, user_corrections, corrected_responses,
+            application_counts, token_counts, timestamps
+        ) = columns
         
-        logger.info(f"Retrieved {len(correction_dicts)} feedback corrections")
+        logger.info(f"Retrieved {len(ids)} feedback corrections")
         
-        return {"corrections": correction_dicts}
+        return {
+            "ids": ids,
+            "correction_types": correction_types,
+            "user_corrections": user_corrections,
+            "corrected_responses": corrected_responses,
+            "application_counts": application_counts,
+            "token_counts": token_counts,
+            "timestamps": [created_at.isoformat() for created_at in timestamps]
+        }
+    
+    @staticmethod
+    def to_rows(feedback_memory: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Convert a column-oriented feedback snapshot to per-correction dicts.
+        
+        Args:
+            feedback_memory: Result of retrieve()
+            
+        Returns:
+            Dictionary with a "corrections" list, as exposed by the API
+        """
+        return {
+            "corrections": [
+                {
+                    "id": feedback_id,
+                    "correction_type": correction_type,
+                    "user_correction": user_correction,
+                    "corrected_response": corrected_response,
+                    "application_count": application_count,
+                    "token_count": token_count,
+                    "relevance_score": 1.0,  # Default relevance (can be enhanced with embeddings)
+                    "timestamp": timestamp
+                }
+                for (
+                    feedback_id, correction_type, user_correction, corrected_response,
+                    application_count, token_count, timestamp
+                ) in zip(
+                    feedback_memory.get("ids", []),
+                    feedback_memory.get("correction_types", []),
+                    feedback_memory.get("user_corrections", []),
+                    feedback_memory.get("corrected_responses", []),
+                    feedback_memory.get("application_counts", []),
+                    feedback_memory.get("token_counts", []),
+                    feedback_memory.get("timestamps", [])
+                )
+            ]
+        }
     
     async def store(
         self,
@@ -69,11 +123,16 @@ class FeedbackMemory(BaseMemory):
         user_correction: str,
         corrected_response: Optional[str],
         context_snapshot: Dict[str, Any],
-        db: Session
+        db: AsyncSession
     ) -> None:
         """
         Store a new feedback correction.
         
+        The row is only staged and flushed (so a following retrieve sees it);
+        the caller owns the transaction and commits it together with the
+        rest of the request, then invalidates the user's cached memory
+        snapshots (MemoryManager.publish_messages does so for chat turns).
+        
         Args:
             feedback_id: Unique feedback identifier
             user_id: User identifier
@@ -87,29 +146,26 @@ class FeedbackMemory(BaseMemory):
         """
         logger.info(f"Storing feedback correction: {feedback_id}")
         
-        try:
-            correction = FeedbackCorrection(
-                feedback_id=feedback_id,
-                user_id=user_id,
-                conversation_id=conversation_id,
-                message_id=message_id,
-                correction_type=correction_type,
-                user_correction=user_correction,
-                corrected_response=corrected_response,
-                context_snapshot=context_snapshot,
-                applied_count=0
-            )
-            
-            db.add(correction)
-            db.commit()
-            
-            logger.info(f"Stored feedback correction: {feedback_id}")
-            
-        except Exception as e:
-            logger.error(f"Error storing feedback correction: {e}")
-            db.rollback()
+        correction = FeedbackCorrection(
+            feedback_id=feedback_id,
+            user_id=user_id,
+            conversation_id=conversation_id,
+            message_id=message_id,
+            correction_type=correction_type,
+            user_correction=user_correction,
+            corrected_response=corrected_response,
+            context_snapshot=context_snapshot,
+            applied_count=0,
+            token_count=token_manager.count_tokens(user_correction or "")
+        )
+        
+        # Stage in database (committed by the caller)
+        db.add(correction)
+        await db.flush()
+        
+        logger.info(f"Staged feedback correction: {feedback_id}")
     
-    async def clear(self, user_id: str, db: Session) -> None:
+    async def clear(self, user_id: str, db: AsyncSession) -> None:
         """
         Clear all feedback corrections for a user.
         
@@ -118,21 +174,25 @@ class FeedbackMemory(BaseMemory):
             db: Database session
         """
         try:
-            db.query(FeedbackCorrection)\
-                .filter(FeedbackCorrection.user_id == user_id)\
-                .delete()
-            db.commit()
+            await db.execute(
+                delete(FeedbackCorrection)
+                .where(FeedbackCorrection.user_id == user_id)
+                # Skip reconciling the identity map; nothing here holds the deleted rows
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            await invalidate_memory_cache(user_id)
             
             logger.info(f"Cleared feedback memory for user: {user_id}")
             
         except Exception as e:
             logger.error(f"Error clearing feedback memory: {e}")
-            db.rollback()
+            await db.rollback()
     
     async def increment_application_count(
         self,
         feedback_id: str,
-        db: Session
+        db: AsyncSession
     ) -> None:
         """
         Increment the application count for a correction.
@@ -142,15 +202,18 @@ class FeedbackMemory(BaseMemory):
             db: Database session
         """
         try:
-            correction = db.query(FeedbackCorrection)\
-                .filter(FeedbackCorrection.feedback_id == feedback_id)\
-                .first()
+            # Increment in the database: one UPDATE, no row load
+            result = await db.execute(
+                update(FeedbackCorrection)
+                .where(FeedbackCorrection.feedback_id == feedback_id)
+                .values(applied_count=FeedbackCorrection.applied_count + 1)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
             
-            if correction:
-                correction.applied_count += 1
-                db.commit()
+            if result.rowcount:
                 logger.info(f"Incremented application count for: {feedback_id}")
                 
         except Exception as e:
             logger.error(f"Error incrementing application count: {e}")
-            db.rollback()
+            await db.rollback()
@@ -1,7 +1,13 @@
-from typing import Dict, Any, Optional
-from sqlalchemy.orm import Session
+from typing import Dict, Any, List, Optional, Tuple
+from cachetools import TTLCache
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.memory.base import BaseMemory
 from app.models.database import UserProfile
+from app.config import settings
+from app.services.cache import invalidate_memory_cache
 from app.observability.logger import get_logger
 
 logger = get_logger(__name__)
@@ -11,12 +17,17 @@ class LongTermMemory(BaseMemory):
     """Long-term memory implementation for user profiles."""
     
     def __init__(self):
-        self.cache: Dict[str, Dict[str, Any]] = {}  # In-memory cache (Redis in production)
+        # Bounded in-memory cache (Redis in production); evicts LRU/expired users.
+        # Only touched from the event loop thread, so no lock is needed.
+        self.cache: TTLCache = TTLCache(
+            maxsize=settings.long_term_cache_size,
+            ttl=settings.long_term_cache_ttl_seconds
+        )
     
     async def retrieve(
         self, 
         user_id: str, 
-        db: Session
+        db: AsyncSession
     ) -> Dict[str, Any]:
         """
         Retrieve user profile from cache or database.
@@ -36,9 +47,10 @@ class LongTermMemory(BaseMemory):
             return self.cache[user_id]
         
         # Query database
-        profile_record = db.query(UserProfile)\
-            .filter(UserProfile.user_id == user_id)\
-            .first()
+        result = await db.execute(
+            select(UserProfile).where(UserProfile.user_id == user_id)
+        )
+        profile_record = result.scalar_one_or_none()
         
         if not profile_record:
             # Create default profile
@@ -57,7 +69,7 @@ class LongTermMemory(BaseMemory):
         self, 
         user_id: str, 
         profile_data: Dict[str, Any],
-        db: Session
+        db: AsyncSession
     ) -> None:
         """
         Store or update user profile.
@@ -69,26 +81,20 @@ class LongTermMemory(BaseMemory):
         """
         logger.info(f"Storing long-term memory for user: {user_id}")
         
-        # Check if profile exists
-        profile_record = db.query(UserProfile)\
-            .filter(UserProfile.user_id == user_id)\
-            .first()
+        # Single-statement upsert (user_id is unique)
+        insert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+        stmt = insert(UserProfile).values(user_id=user_id, profile_data=profile_data)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserProfile.user_id],
+            set_={"profile_data": stmt.excluded.profile_data, "updated_at": func.now()}
+        )
+        await db.execute(stmt)
         
-        if profile_record:
-            # Update existing profile
-            profile_record.profile_data = profile_data
-        else:
-            # Create new profile
-            profile_record = UserProfile(
-                user_id=user_id,
-                profile_data=profile_data
-            )
-            db.add(profile_record)
-        
-        db.commit()
+        await db.commit()
         
-        # Update cache
+        # Update cache; cached memory snapshots embed the old profile
         self.cache[user_id] = profile_data
+        await invalidate_memory_cache(user_id)
         
         logger.info(f"Stored profile for user: {user_id}")
     
@@ -129,7 +135,7 @@ class LongTermMemory(BaseMemory):
         self, 
         user_id: str, 
         updates: Dict[str, Any],
-        db: Session
+        db: AsyncSession
     ) -> Dict[str, Any]:
         """
         Update specific fields in user profile.
@@ -153,14 +159,18 @@ class LongTermMemory(BaseMemory):
         
         return updated_profile
     
-    def _deep_merge(self, base: Dict, updates: Dict) -> Dict:
-        """Deep merge two dictionaries."""
-        result = base.copy()
-        
-        for key, value in updates.items():
-            if key in result and isinstance(result[key], dict) and isinstance(value, dict):
-                result[key] = self._deep_merge(result[key], value)
-            else:
-                result[key] = value
+    def _deep_merge(self, base: Dict[str, Any], updates: Dict[str, Any]) -> Dict[str, Any]:
+        """Deep merge two dictionaries (iteratively, copying only merged levels)."""
+        result: Dict[str, Any] = {**base}
+        stack: List[Tuple[Dict[str, Any], Dict[str, Any]]] = [(result, updates)]
+        
+        while stack:
+            dst, src = stack.pop()
+            for key, value in src.items():
+                if isinstance(value, dict) and isinstance(dst.get(key), dict):
+                    dst[key] = {**dst[key]}
+                    stack.append((dst[key], value))
+                else:
+                    dst[key] = value
         
         return result
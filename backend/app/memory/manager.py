@@ -1,9 +1,18 @@
-from typing import Dict, Any, List
-from sqlalchemy.orm import Session
+import asyncio
+from typing import Dict, Any, List, Callable, Awaitable
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import AsyncSessionLocal
 from app.memory.short_term import ShortTermMemory
 from app.memory.long_term import LongTermMemory
 from app.memory.semantic import SemanticMemory
 from app.memory.feedback import FeedbackMemory
+from app.services.cache import (
+    memory_cache_key,
+    get_cached_memory,
+    set_cached_memory,
+    invalidate_memory_cache,
+)
 from app.observability.logger import get_logger
 
 logger = get_logger(__name__)
@@ -23,8 +32,8 @@ class MemoryManager:
         user_id: str,
         conversation_id: str,
         query: str,
-        query_embedding: List[float],
-        db: Session
+        query_embedding: np.ndarray,
+        db: AsyncSession
     ) -> Dict[str, Any]:
         """
         Retrieve all memory types in parallel.
@@ -34,18 +43,28 @@ class MemoryManager:
             conversation_id: Conversation identifier
             query: User's current query
             query_embedding: Embedding of the query
-            db: Database session
+            db: Database session (used by short-term retrieval; the other
+                DB-backed retrievals get their own sessions so all can run
+                concurrently)
             
         Returns:
             Aggregated memory snapshot
         """
         logger.info(f"Retrieving all memories for user: {user_id}, conversation: {conversation_id}")
         
-        # Retrieve all memories (in production, use asyncio.gather for parallel execution)
-        short_term_memory = await self.short_term.retrieve(conversation_id, db)
-        long_term_memory = await self.long_term.retrieve(user_id, db)
-        semantic_memory = await self.semantic.retrieve(user_id=user_id, query_embedding=query_embedding)
-        feedback_memory = await self.feedback.retrieve(user_id, db, query)
+        # Retrieve all memories concurrently; an AsyncSession must not be
+        # shared between concurrent operations
+        (
+            short_term_memory,
+            long_term_memory,
+            semantic_memory,
+            feedback_memory
+        ) = await asyncio.gather(
+            self.short_term.retrieve(conversation_id, db),
+            self._in_own_session(lambda session: self.long_term.retrieve(user_id, session)),
+            self.semantic.retrieve(user_id=user_id, query_embedding=query_embedding),
+            self._in_own_session(lambda session: self.feedback.retrieve(user_id, session, query))
+        )
         
         memory_snapshot = {
             "short_term_memory": short_term_memory,
@@ -58,19 +77,74 @@ class MemoryManager:
         
         return memory_snapshot
     
-    async def store_message(
+    async def close(self) -> None:
+        """Flush pending writes; call on application shutdown."""
+        await self.semantic.close()
+    
+    @staticmethod
+    async def _in_own_session(
+        retrieve: Callable[[AsyncSession], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """Run a retrieval on a dedicated database session."""
+        async with AsyncSessionLocal() as session:
+            return await retrieve(session)
+    
+    async def retrieve_all_memories_cached(
+        self,
+        user_id: str,
+        conversation_id: str,
+        query: str,
+        query_embedding: np.ndarray,
+        db: AsyncSession
+    ) -> Dict[str, Any]:
+        """
+        Retrieve all memory types, serving repeated queries from a short-TTL cache.
+        
+        Args:
+            user_id: User identifier
+            conversation_id: Conversation identifier
+            query: User's current query
+            query_embedding: Embedding of the query
+            db: Database session
+            
+        Returns:
+            Aggregated memory snapshot
+        """
+        key = memory_cache_key(user_id, conversation_id, query)
+        
+        memory_snapshot = await get_cached_memory(key)
+        if memory_snapshot is not None:
+            logger.info(f"Retrieved memory snapshot from cache for user: {user_id}")
+            return memory_snapshot
+        
+        memory_snapshot = await self.retrieve_all_memories(
+            user_id=user_id,
+            conversation_id=conversation_id,
+            query=query,
+            query_embedding=query_embedding,
+            db=db
+        )
+        await set_cached_memory(key, memory_snapshot)
+        
+        return memory_snapshot
+    
+    def stage_message(
         self,
         user_id: str,
         conversation_id: str,
         message_id: str,
         content: str,
         role: str,
-        embedding: List[float],
+        embedding: np.ndarray,
         metadata: Dict[str, Any],
-        db: Session
-    ) -> None:
+        db: AsyncSession
+    ) -> Dict[str, Any]:
         """
-        Store message in appropriate memory systems.
+        Stage a message row on the session.
+        
+        Nothing outside the database is touched here; the caller commits the
+        transaction and then hands the staged records to `publish_messages`,
+        so a rollback leaves the caches and the vector store untouched.
         
         Args:
             user_id: User identifier
@@ -81,33 +155,73 @@ class MemoryManager:
             embedding: Message embedding
             metadata: Additional metadata
             db: Database session
+            
+        Returns:
+            Staged record for `publish_messages`
         """
+        from datetime import datetime, timezone
         from app.models.database import Message
         
-        # Create message object
+        # Create message object (timestamp set client-side so the cached
+        # copy is complete before the transaction is flushed)
         message = Message(
             message_id=message_id,
             conversation_id=conversation_id,
             role=role,
             content=content,
             tokens_used=metadata.get("tokens", 0),
-            embedding_id=message_id
+            embedding_id=message_id,
+            created_at=datetime.now(timezone.utc)
         )
         
-        # Store in database
+        # Stage in database (committed by the caller)
         db.add(message)
-        db.commit()
         
-        # Store in short-term memory cache
-        await self.short_term.store(conversation_id, message)
+        return {
+            "user_id": user_id,
+            "conversation_id": conversation_id,
+            "message": message,
+            "embedding": embedding,
+            "metadata": metadata
+        }
+    
+    async def publish_messages(
+        self,
+        staged: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Apply the non-database side effects of committed messages.
         
-        # Store in semantic memory (ChromaDB)
-        await self.semantic.store(
-            message_id=message_id,
-            user_id=user_id,
-            content=content,
-            embedding=embedding,
-            metadata=metadata
-        )
+        Must only be called once the transaction holding the staged rows
+        has been committed.
+        
+        Args:
+            staged: Records returned by `stage_message`
+            
+        Returns:
+            Messages as cached in short-term memory, in input order
+        """
+        message_dicts = []
+        for record in staged:
+            conversation_id = record["conversation_id"]
+            message = record["message"]
+            
+            # Store in short-term memory cache
+            await self.short_term.store(conversation_id, message)
+            message_dicts.append(self.short_term.cache[conversation_id][-1])
+            
+            # Store in semantic memory (ChromaDB)
+            await self.semantic.store(
+                message_id=message.message_id,
+                user_id=record["user_id"],
+                content=message.content,
+                embedding=record["embedding"],
+                metadata=record["metadata"]
+            )
+            logger.info(f"Stored message {message.message_id} in all memory systems")
+        
+        # Cached snapshots for these users are now stale
+        for user_id in {record["user_id"] for record in staged}:
+            await invalidate_memory_cache(user_id)
         
-        logger.info(f"Stored message {message_id} in all memory systems")
+        return message_dicts
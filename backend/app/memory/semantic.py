@@ -1,7 +1,14 @@
 import os
-from typing import List, Dict, Any, Optional
+import asyncio
+import contextlib
+from typing import List, Dict, Any, Optional, Tuple, Union
+import numpy as np
+from cachetools import TTLCache
 from app.memory.base import BaseMemory
+from app.models.schemas import SemanticHit
 from app.config import settings as app_settings
+from app.core.token_manager import token_manager
+from app.services.cache import invalidate_memory_cache
 from app.observability.logger import get_logger
 
 try:
@@ -10,14 +17,21 @@ try:
     CHROMADB_AVAILABLE = True
 except Exception as e:
     CHROMADB_AVAILABLE = False
-    print(f"DEBUG ERROR: ChromaDB import failed: {e}")
     # Use standard logging here as this is module-level
     import logging
     logging.getLogger(__name__).error(f"ChromaDB import failed: {e}")
 
-print(f"DEBUG: CHROMADB_AVAILABLE = {CHROMADB_AVAILABLE}")
 logger = get_logger(__name__)
 
+# Consecutive failed flushes a queued batch is retried for before it is dropped
+FLUSH_MAX_ATTEMPTS = 3
+
+
+def _lsh_key(query_embedding: List[float], hyperplanes: np.ndarray) -> bytes:
+    """Pack the signs of the embedding's projections onto random hyperplanes."""
+    projections = hyperplanes @ np.asarray(query_embedding, dtype=np.float32)
+    return np.packbits(projections > 0).tobytes()
+
 
 class SemanticMemory(BaseMemory):
     """Semantic memory implementation using ChromaDB."""
@@ -26,6 +40,30 @@ class SemanticMemory(BaseMemory):
         self.client = None
         self.collection = None
         
+        # Write-behind buffer drained into batch_store by a background task
+        self._write_buffer: List[Tuple[str, str, str, List[float], Dict[str, Any]]] = []
+        self._flush_pending = asyncio.Event()
+        self._flush_full = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_failures = 0
+        # Embeddings lost after FLUSH_MAX_ATTEMPTS failed flushes
+        self.dropped_writes = 0
+        
+        # Concurrent queries coalesced into one collection.query per user
+        self._query_queue: List[Tuple[str, List[float], int, asyncio.Future]] = []
+        self._query_pending = asyncio.Event()
+        self._query_full = asyncio.Event()
+        self._query_task: Optional[asyncio.Task] = None
+        
+        # (user_id, LSH of query embedding, k, threshold) -> (results, normalized
+        # query vector); the vector serves near-duplicate lookups and expires
+        # with the results, so nothing outlives the cache's size and TTL bounds
+        self._query_cache = TTLCache(
+            maxsize=app_settings.semantic_query_cache_size,
+            ttl=app_settings.semantic_query_cache_ttl_seconds
+        )
+        self._hyperplanes: Optional[np.ndarray] = None
+        
         if not CHROMADB_AVAILABLE:
             logger.warning("ChromaDB not available. Semantic memory disabled.")
             return
@@ -33,20 +71,23 @@ class SemanticMemory(BaseMemory):
         # Initialize ChromaDB client using modern PersistentClient
         try:
             persist_path = os.path.abspath(app_settings.chroma_persist_dir)
-            print(f"DEBUG: Initializing ChromaDB at {persist_path}")
+            logger.debug("Initializing ChromaDB at %s", persist_path)
             self.client = chromadb.PersistentClient(path=persist_path)
             
             # Get or create collection
             self.collection = self.client.get_or_create_collection(
                 name="semantic_memory_global",
                 metadata={
-                    "hnsw:space": "cosine"
+                    "hnsw:space": "cosine",
+                    # Index parameters only take effect when the collection is created
+                    "hnsw:M": app_settings.semantic_hnsw_m,
+                    "hnsw:construction_ef": app_settings.semantic_hnsw_construction_ef,
+                    "hnsw:search_ef": app_settings.semantic_hnsw_search_ef,
+                    "hnsw:num_threads": os.cpu_count() or 1
                 }
             )
-            print("DEBUG: Semantic memory collection initialized successfully")
             logger.info("Semantic memory collection initialized using PersistentClient")
         except Exception as e:
-            print(f"DEBUG ERROR: Failed to initialize ChromaDB: {e}")
             logger.error(f"Failed to initialize ChromaDB: {e}. Semantic memory disabled.")
             self.client = None
             self.collection = None
@@ -76,52 +117,224 @@ class SemanticMemory(BaseMemory):
             logger.warning("Semantic memory disabled (no ChromaDB). Returning empty.")
             return {"relevant_memories": []}
         
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+        
+        cache_key = (user_id, self._query_hash(query_vector), k, similarity_threshold)
+        entry = self._query_cache.get(cache_key)
+        if entry is not None:
+            cached = entry[0]
+        else:
+            cached = self._similar_cached_query(user_id, query_vector, k, similarity_threshold)
+        if cached is not None:
+            logger.info(f"Semantic query cache hit for user: {user_id}")
+            return {"relevant_memories": list(cached)}
+        
         try:
-            # Query ChromaDB - temporarily remove where filter to debug
-            print(f"DEBUG: Collection count before query: {self.collection.count()}")
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=k,
-                # where={"user_id": user_id},
-                include=["documents", "metadatas", "distances"]
-            )
+            # Query ChromaDB, pre-filtered to this user's memories
+            results = await self._batched_query(user_id, query_embedding, k)
             
-            # Formatted debug for inspection
-            debug_info = f"DEBUG: ChromaDB raw results (filtered by similarity {similarity_threshold}): {results}"
-            print(debug_info)
-            with open("data/semantic_debug.log", "a", encoding="utf-8") as f:
-                import datetime
-                f.write(f"{datetime.datetime.now()} - {debug_info}\n")
+            # Lazy %-formatting: results are only stringified when DEBUG is enabled
+            logger.debug("ChromaDB raw results (threshold %s): %s", similarity_threshold, results)
             
             # Filter by similarity threshold and format results
             relevant_memories = []
             
             if results['documents'] and len(results['documents'][0]) > 0:
-                for doc, metadata, distance in zip(
-                    results['documents'][0],
-                    results['metadatas'][0],
-                    results['distances'][0]
-                ):
-                    similarity_score = 1 - distance  # Convert distance to similarity
-                    
-                    if similarity_score >= similarity_threshold:
-                        relevant_memories.append({
-                            "content": doc,
-                            "metadata": metadata,
-                            "similarity_score": round(similarity_score, 3)
-                        })
+                ids = results['ids'][0]
+                docs = results['documents'][0]
+                metadatas = results['metadatas'][0]
+                
+                # Convert distances to similarities and threshold in one vectorized pass
+                similarities = 1.0 - np.asarray(results['distances'][0], dtype=np.float64)
+                keep = np.flatnonzero(similarities >= similarity_threshold)
+                scores = np.round(similarities[keep], 3).tolist()
+                
+                relevant_memories = [
+                    SemanticHit(
+                        id=ids[i],
+                        content=docs[i],
+                        metadata=metadatas[i],
+                        similarity_score=score
+                    )
+                    for i, score in zip(keep.tolist(), scores)
+                ]
             
             logger.info(
                 f"Retrieved {len(relevant_memories)} relevant memories "
                 f"(threshold: {similarity_threshold})"
             )
             
-            return {"relevant_memories": relevant_memories}
+            self._query_cache[cache_key] = (relevant_memories, query_vector)
+            
+            return {"relevant_memories": list(relevant_memories)}
             
         except Exception as e:
             logger.error(f"Error retrieving semantic memory: {e}")
             return {"relevant_memories": []}
     
+    async def _batched_query(
+        self,
+        user_id: str,
+        query_embedding: List[float],
+        k: int
+    ) -> Dict[str, Any]:
+        """
+        Queue a query for the batcher and wait for its results.
+        
+        Args:
+            user_id: User identifier for filtering
+            query_embedding: Query embedding vector
+            k: Number of results to retrieve
+            
+        Returns:
+            ChromaDB query results for this embedding alone
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._query_queue.append((user_id, query_embedding, k, future))
+        
+        if self._query_task is None or self._query_task.done():
+            self._query_task = asyncio.create_task(self._query_loop())
+        self._query_pending.set()
+        if len(self._query_queue) >= app_settings.semantic_query_batch_size:
+            self._query_full.set()
+        
+        return await future
+    
+    async def _query_loop(self) -> None:
+        """Run queued queries in batches until cancelled."""
+        window = app_settings.semantic_query_batch_window_ms / 1000
+        
+        while True:
+            await self._query_pending.wait()
+            
+            # Let concurrent requests join the batch
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._query_full.wait(), timeout=window)
+            
+            self._query_pending.clear()
+            self._query_full.clear()
+            batch, self._query_queue = self._query_queue, []
+            try:
+                await self._run_queries(batch)
+            except asyncio.CancelledError:
+                self._fail_queries(batch)
+                raise
+    
+    async def _run_queries(self, batch: List[Tuple[str, List[float], int, asyncio.Future]]) -> None:
+        """Issue one ChromaDB query per user and hand each caller its slice."""
+        by_user: Dict[str, List[Tuple[str, List[float], int, asyncio.Future]]] = {}
+        for request in batch:
+            by_user.setdefault(request[0], []).append(request)
+        
+        # Queries are blocking: run them in worker threads, users concurrently
+        await asyncio.gather(*(
+            self._run_user_queries(user_id, requests)
+            for user_id, requests in by_user.items()
+        ))
+    
+    async def _run_user_queries(
+        self,
+        user_id: str,
+        requests: List[Tuple[str, List[float], int, asyncio.Future]]
+    ) -> None:
+        """Run one user's batched queries and resolve their futures."""
+        try:
+            results = await asyncio.to_thread(
+                self.collection.query,
+                # ChromaDB 0.4 validates embeddings as lists of Python floats
+                query_embeddings=np.asarray(
+                    [embedding for _, embedding, _, _ in requests], dtype=np.float32
+                ).tolist(),
+                n_results=max(k for _, _, k, _ in requests),
+                where={"user_id": user_id},
+                include=["documents", "metadatas", "distances"]
+            )
+        except Exception as e:
+            for *_, future in requests:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for i, (_, _, k, future) in enumerate(requests):
+            if not future.done():  # Caller may have been cancelled
+                future.set_result({
+                    key: [results[key][i][:k]]
+                    for key in ("ids", "documents", "metadatas", "distances")
+                })
+    
+    @staticmethod
+    def _fail_queries(batch: List[Tuple[str, List[float], int, asyncio.Future]]) -> None:
+        """Cancel the callers' futures for queries that will never run."""
+        for *_, future in batch:
+            future.cancel()  # No-op for futures already resolved
+    
+    def _query_hash(self, query_embedding: List[float]) -> bytes:
+        """
+        Locality-sensitive hash of a query embedding.
+        
+        Near-identical queries fall on the same side of every hyperplane and
+        therefore share a cache entry.
+        
+        Args:
+            query_embedding: Query embedding vector
+            
+        Returns:
+            Packed sign bits (semantic_query_cache_bits wide)
+        """
+        dim = len(query_embedding)
+        if self._hyperplanes is None or self._hyperplanes.shape[1] != dim:
+            # Fixed seed keeps keys stable for the lifetime of the process
+            rng = np.random.default_rng(0)
+            self._hyperplanes = rng.standard_normal(
+                (app_settings.semantic_query_cache_bits, dim)
+            ).astype(np.float32)
+        
+        return _lsh_key(query_embedding, self._hyperplanes)
+    
+    def _similar_cached_query(
+        self,
+        user_id: str,
+        query_vector: np.ndarray,
+        k: int,
+        similarity_threshold: float
+    ) -> Optional[List[SemanticHit]]:
+        """
+        Find a cached result whose query is a near-duplicate of this one.
+        
+        Catches paraphrases that land in a different LSH bucket, using one
+        matrix-vector product over the user's live cached queries.
+        
+        Args:
+            user_id: User identifier
+            query_vector: L2-normalized query embedding
+            k: Number of results requested
+            similarity_threshold: Minimum similarity score requested
+            
+        Returns:
+            Cached relevant memories, or None if no cached query is similar enough
+        """
+        # Drop expired entries first so the scan below only sees live results
+        self._query_cache.expire()
+        entries = [
+            entry for key, entry in self._query_cache.items()
+            if key[0] == user_id and key[2:] == (k, similarity_threshold)
+        ]
+        if not entries:
+            return None
+        
+        scores = np.stack([vector for _, vector in entries]) @ query_vector
+        best = int(np.argmax(scores))
+        if scores[best] < app_settings.semantic_query_cache_similarity:
+            return None
+        
+        return entries[best][0]
+    
+    def _invalidate_queries(self, user_id: str) -> None:
+        """Drop cached retrieval results for a user."""
+        for key in [key for key in self._query_cache if key[0] == user_id]:
+            self._query_cache.pop(key, None)
+    
     async def store(
         self, 
         message_id: str,
@@ -131,7 +344,11 @@ class SemanticMemory(BaseMemory):
         metadata: Dict[str, Any]
     ) -> None:
         """
-        Store message embedding in ChromaDB.
+        Queue message embedding for a batched write to ChromaDB.
+        
+        The write is flushed by a background task once
+        semantic_flush_batch_size items are queued or after
+        semantic_flush_interval_ms, whichever comes first.
         
         Args:
             message_id: Unique message identifier
@@ -140,26 +357,95 @@ class SemanticMemory(BaseMemory):
             embedding: Embedding vector
             metadata: Additional metadata
         """
-        try:
-            if self.collection is None:
-                print("DEBUG: Semantic memory disabled (no ChromaDB). Skipping store.")
-                return
-            
-            # Add user_id to metadata for filtering
-            metadata["user_id"] = user_id
-            
-            self.collection.add(
-                ids=[message_id],
-                embeddings=[embedding],
-                documents=[content],
-                metadatas=[metadata]
-            )
+        if self.collection is None:
+            logger.debug("Semantic memory disabled (no ChromaDB). Skipping store.")
+            return
+        
+        self._write_buffer.append((message_id, user_id, content, embedding, metadata))
+        self._ensure_flusher()
+        self._flush_pending.set()
+        if len(self._write_buffer) >= app_settings.semantic_flush_batch_size:
+            self._flush_full.set()
+    
+    def _ensure_flusher(self) -> None:
+        """Start the background flush task on the running loop if needed."""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+    
+    async def _flush_loop(self) -> None:
+        """Drain the write buffer in batches until cancelled."""
+        interval = app_settings.semantic_flush_interval_ms / 1000
+        
+        while True:
+            await self._flush_pending.wait()
             
-            print(f"DEBUG: Stored embedding for message: {message_id}. Total count now: {self.collection.count()}")
+            # Collect more writes until the batch fills or the interval passes
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._flush_full.wait(), timeout=interval)
             
-        except Exception as e:
-            print(f"DEBUG ERROR storing semantic memory: {e}")
-            logger.error(f"Error storing semantic memory: {e}")
+            self._flush_pending.clear()
+            self._flush_full.clear()
+            await self.flush()
+    
+    async def flush(self) -> None:
+        """Write all queued embeddings to ChromaDB in one batch."""
+        if not self._write_buffer:
+            return
+        
+        batch, self._write_buffer = self._write_buffer, []
+        message_ids, user_ids, contents, embeddings, metadatas = (
+            list(column) for column in zip(*batch)
+        )
+        
+        try:
+            await self.batch_store(
+                message_ids=message_ids,
+                user_ids=user_ids,
+                contents=contents,
+                embeddings=embeddings,
+                metadatas=metadatas
+            )
+        except Exception:
+            self._flush_failures += 1
+            if self._flush_failures < FLUSH_MAX_ATTEMPTS:
+                # Put the batch back ahead of newer writes; the flusher
+                # retries it on its next interval
+                self._write_buffer[:0] = batch
+                self._flush_pending.set()
+                logger.warning(
+                    f"Re-queued {len(batch)} embeddings after failed flush "
+                    f"(attempt {self._flush_failures}/{FLUSH_MAX_ATTEMPTS})"
+                )
+            else:
+                self._flush_failures = 0
+                self.dropped_writes += len(batch)
+                logger.error(
+                    f"Dropped {len(batch)} embeddings after {FLUSH_MAX_ATTEMPTS} "
+                    f"failed flushes ({self.dropped_writes} dropped in total)"
+                )
+            return
+        
+        self._flush_failures = 0
+    
+    async def close(self) -> None:
+        """Stop the background tasks and write any queued embeddings."""
+        if self._query_task is not None:
+            self._query_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._query_task
+            self._query_task = None
+        
+        # Queued queries would otherwise wait forever
+        batch, self._query_queue = self._query_queue, []
+        self._fail_queries(batch)
+        
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flush_task
+            self._flush_task = None
+        
+        await self.flush()
     
     async def clear(self, user_id: str) -> None:
         """
@@ -169,7 +455,13 @@ class SemanticMemory(BaseMemory):
             user_id: User identifier
         """
         try:
+            # Don't let queued writes resurrect cleared memories
+            await self.flush()
+            # ...including a batch re-queued by a failed flush
+            self._write_buffer = [item for item in self._write_buffer if item[1] != user_id]
             self.collection.delete(where={"user_id": user_id})
+            self._invalidate_queries(user_id)
+            await invalidate_memory_cache(user_id)
             logger.info(f"Cleared semantic memory for user: {user_id}")
         except Exception as e:
             logger.error(f"Error clearing semantic memory: {e}")
@@ -179,7 +471,7 @@ class SemanticMemory(BaseMemory):
         message_ids: List[str],
         user_ids: List[str],
         contents: List[str],
-        embeddings: List[List[float]],
+        embeddings: Union[np.ndarray, List[List[float]]],
         metadatas: List[Dict[str, Any]]
     ) -> None:
         """
@@ -189,22 +481,93 @@ class SemanticMemory(BaseMemory):
             message_ids: List of message identifiers
             user_ids: List of user identifiers
             contents: List of message contents
-            embeddings: List of embedding vectors
+            embeddings: 2-D array or list of embedding vectors
             metadatas: List of metadata dictionaries
+            
+        Raises:
+            Exception: If the ChromaDB write fails (nothing is stored)
         """
         try:
-            # Add user_id to each metadata
-            for i, user_id in enumerate(user_ids):
-                metadatas[i]["user_id"] = user_id
-            
-            self.collection.add(
-                ids=message_ids,
-                embeddings=embeddings,
-                documents=contents,
-                metadatas=metadatas
+            # Tokenizing, list conversion and the ChromaDB write are all
+            # CPU/IO-bound: run them off the event loop
+            await asyncio.to_thread(
+                self._add_batch, message_ids, user_ids, contents, embeddings, metadatas
             )
             
+            # New memories are only visible once written, so invalidate here
+            for user_id in set(user_ids):
+                self._invalidate_queries(user_id)
+            
             logger.info(f"Batch stored {len(message_ids)} embeddings")
             
         except Exception as e:
             logger.error(f"Error batch storing semantic memory: {e}")
+            raise
+    
+    def _add_batch(
+        self,
+        message_ids: List[str],
+        user_ids: List[str],
+        contents: List[str],
+        embeddings: Union[np.ndarray, List[List[float]]],
+        metadatas: List[Dict[str, Any]]
+    ) -> None:
+        """Write one batch to ChromaDB (blocking; see batch_store)."""
+        # Add user_id and token count to each metadata
+        token_counts = token_manager.count_tokens_batch(contents)
+        for i, user_id in enumerate(user_ids):
+            metadatas[i]["user_id"] = user_id
+            metadatas[i]["token_count"] = token_counts[i]
+        
+        # ChromaDB 0.4 validates embeddings as lists: convert the whole
+        # matrix (or list of float32 vectors) in one C-level pass
+        embeddings = np.asarray(embeddings, dtype=np.float32).tolist()
+        
+        self.collection.add(
+            ids=message_ids,
+            embeddings=embeddings,
+            documents=contents,
+            metadatas=metadatas
+        )
+    
+    async def bulk_load(
+        self,
+        message_ids: List[str],
+        user_ids: List[str],
+        contents: List[str],
+        embeddings: Union[np.ndarray, List[List[float]]],
+        metadatas: List[Dict[str, Any]],
+        chunk_size: Optional[int] = None
+    ) -> None:
+        """
+        Load a large set of embeddings, e.g. when hydrating from SQL on cold start.
+        
+        Bypasses the write-behind queue and adds in chunks no larger than the
+        client's max batch size, yielding to the event loop between chunks.
+        
+        Args:
+            message_ids: List of message identifiers
+            user_ids: List of user identifiers
+            contents: List of message contents
+            embeddings: 2-D array or list of embedding vectors
+            metadatas: List of metadata dictionaries
+            chunk_size: Records per add() call (defaults to the client's max batch size)
+        """
+        if self.collection is None:
+            logger.warning("Semantic memory disabled (no ChromaDB). Skipping bulk load.")
+            return
+        
+        chunk_size = chunk_size or getattr(self.client, "max_batch_size", 5000)
+        
+        for start in range(0, len(message_ids), chunk_size):
+            end = start + chunk_size
+            await self.batch_store(
+                message_ids=message_ids[start:end],
+                user_ids=user_ids[start:end],
+                contents=contents[start:end],
+                embeddings=embeddings[start:end],
+                metadatas=metadatas[start:end]
+            )
+            await asyncio.sleep(0)
+        
+        logger.info(f"Bulk loaded {len(message_ids)} embeddings")
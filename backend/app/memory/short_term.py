@@ -1,24 +1,67 @@
 from collections import deque
-from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
+from itertools import islice
+from datetime import datetime
+from typing import List, Dict, Any, Callable, Optional
+from cachetools import LRUCache
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.memory.base import BaseMemory
 from app.models.database import Message
+from app.config import settings
 from app.observability.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Message-like type -> converter to the cached dict shape, built on first use
+_CONVERTERS: Dict[type, Callable[[Any], Dict[str, Any]]] = {}
+
+
+def _build_converter(sample: Any) -> Callable[[Any], Dict[str, Any]]:
+    """
+    Build a dict converter for messages shaped like sample.
+    
+    Attribute presence is checked once per type rather than on every message.
+    
+    Args:
+        sample: First message seen of its type
+        
+    Returns:
+        Function converting a message of that type to the cached dict shape
+    """
+    has_message_id = hasattr(sample, "message_id")
+    has_tokens = hasattr(sample, "tokens_used")
+    has_created_at = hasattr(sample, "created_at")
+    
+    def convert(msg: Any) -> Dict[str, Any]:
+        created_at = msg.created_at if has_created_at else ""
+        return {
+            "id": msg.message_id if has_message_id else str(msg.id),
+            "role": msg.role,
+            "content": msg.content,
+            "tokens": msg.tokens_used if has_tokens else 0,
+            "timestamp": created_at.isoformat() if isinstance(created_at, datetime) else str(created_at),
+            "includedInPrompt": True
+        }
+    
+    return convert
+
 
 class ShortTermMemory(BaseMemory):
     """Short-term memory implementation using in-memory cache."""
     
-    def __init__(self, max_messages: int = 20):
-        self.cache: Dict[str, deque] = {}
+    def __init__(
+        self,
+        max_messages: int = 20,
+        max_conversations: int = settings.short_term_cache_size
+    ):
+        # Least recently used conversations are evicted and reload from the database
+        self.cache: LRUCache = LRUCache(maxsize=max_conversations)
         self.max_messages = max_messages
     
     async def retrieve(
         self, 
         conversation_id: str, 
-        db: Session,
+        db: AsyncSession,
         limit: int = 10
     ) -> Dict[str, Any]:
         """
@@ -36,21 +79,27 @@ class ShortTermMemory(BaseMemory):
         
         # Check cache first
         if conversation_id in self.cache:
-            message_dicts = list(self.cache[conversation_id])[-limit:]
+            cached = self.cache[conversation_id]
+            message_dicts = list(islice(cached, max(0, len(cached) - limit), None))
             logger.info(f"Retrieved {len(message_dicts)} messages from cache")
         else:
-            # Cache miss - load from database
-            db_messages = db.query(Message)\
-                .filter(Message.conversation_id == conversation_id)\
-                .order_by(Message.created_at.desc())\
-                .limit(limit)\
-                .all()
-            
-            # Reverse to chronological order
-            db_messages = list(reversed(db_messages))
+            # Cache miss - load from database as plain rows (no ORM hydration)
+            result = await db.execute(
+                select(
+                    Message.message_id,
+                    Message.role,
+                    Message.content,
+                    Message.tokens_used,
+                    Message.created_at
+                )
+                .where(Message.conversation_id == conversation_id)
+                .order_by(Message.created_at.desc())
+                .limit(limit)
+            )
+            rows = result.all()
             
-            # Convert ORM objects to dicts immediately to avoid DetachedInstanceError
-            message_dicts = [self._msg_to_dict(m) for m in db_messages]
+            # Walk the newest-first rows backwards into chronological order
+            message_dicts = [self._row_to_dict(row) for row in reversed(rows)]
             
             # Populate cache with plain dicts (not ORM objects)
             self.cache[conversation_id] = deque(message_dicts, maxlen=self.max_messages)
@@ -62,16 +111,24 @@ class ShortTermMemory(BaseMemory):
         }
     
     @staticmethod
-    def _msg_to_dict(msg) -> Dict[str, Any]:
-        """Convert a Message ORM object to a plain dict for safe caching."""
+    def _row_to_dict(row) -> Dict[str, Any]:
+        """Convert a selected message row to the cached dict shape."""
         return {
-            "id": msg.message_id if hasattr(msg, 'message_id') else str(msg.id),
-            "role": msg.role,
-            "content": msg.content,
-            "tokens": msg.tokens_used if hasattr(msg, 'tokens_used') else 0,
-            "timestamp": msg.created_at.isoformat() if hasattr(msg, 'created_at') and hasattr(msg.created_at, 'isoformat') else str(getattr(msg, 'created_at', '')),
+            "id": row.message_id,
+            "role": row.role,
+            "content": row.content,
+            "tokens": row.tokens_used or 0,
+            "timestamp": row.created_at.isoformat(),
             "includedInPrompt": True
         }
+    
+    @staticmethod
+    def _msg_to_dict(msg) -> Dict[str, Any]:
+        """Convert a Message ORM object to a plain dict for safe caching."""
+        converter = _CONVERTERS.get(type(msg))
+        if converter is None:
+            converter = _CONVERTERS[type(msg)] = _build_converter(msg)
+        return converter(msg)
 
     async def store(
         self, 
@@ -120,11 +177,8 @@ class ShortTermMemory(BaseMemory):
         if conversation_id not in self.cache:
             return False
         
-        messages = self.cache[conversation_id]
-        total_tokens = sum(
-            msg.tokens_used if hasattr(msg, 'tokens_used') else 0 
-            for msg in messages
-        )
+        # Cached messages are plain dicts (see _msg_to_dict)
+        total_tokens = sum(msg["tokens"] for msg in self.cache[conversation_id])
         
         should_summarize = total_tokens > token_threshold
         
@@ -1,8 +1,12 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON, Float
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON, Float, Index
 from sqlalchemy.orm import relationship, mapped_column
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from app.db.session import Base
 
+# Binary JSONB on Postgres (no reparse on read); plain JSON elsewhere (SQLite)
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
 
 class User(Base):
     """User model for authentication and subscription management."""
@@ -57,12 +61,17 @@ class Message(Base):
     role = Column(String(50), nullable=False)  # user, assistant, system
     content = Column(Text, nullable=False)
     tokens_used = Column(Integer, default=0)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
     embedding_id = Column(String(255), index=True)  # Reference to ChromaDB
-    message_metadata = Column(JSON)  # Additional context
+    message_metadata = Column(JSONType)  # Additional context
     
     # Relationships
     conversation = relationship("Conversation", back_populates="messages")
+    
+    # Serves ShortTermMemory.retrieve: latest messages per conversation, in index order
+    __table_args__ = (
+        Index("ix_messages_conversation_id_created_at", "conversation_id", created_at.desc()),
+    )
 
 
 class UserProfile(Base):
@@ -71,7 +80,7 @@ class UserProfile(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(String(255), ForeignKey("users.user_id", ondelete="CASCADE"), unique=True, nullable=False, index=True)
-    profile_data = Column(JSON, nullable=False)  # Structured user preferences
+    profile_data = Column(JSONType, nullable=False)  # Structured user preferences
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
@@ -91,12 +100,18 @@ class FeedbackCorrection(Base):
     correction_type = Column(String(50), nullable=False)  # factual_error, tone_issue, irrelevant
     user_correction = Column(Text)  # What user said was wrong
     corrected_response = Column(Text)  # What should have been said
-    context_snapshot = Column(JSON)  # Memory state at time of error
+    context_snapshot = Column(JSONType)  # Memory state at time of error
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     applied_count = Column(Integer, default=0)  # How many times this correction influenced responses
+    token_count = Column(Integer, default=0)  # Tokens in user_correction, computed at write time
     
     # Relationships
     user = relationship("User", back_populates="feedback_corrections")
+    
+    # Serves FeedbackMemory.retrieve: latest corrections per user, in index order
+    __table_args__ = (
+        Index("ix_feedback_corrections_user_id_created_at", "user_id", created_at.desc()),
+    )
 
 
 class ConversationSummary(Base):
@@ -129,7 +144,7 @@ class MemoryAccessLog(Base):
     access_timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     items_retrieved = Column(Integer, default=0)
     retrieval_time_ms = Column(Float)
-    access_metadata = Column(JSON)  # Memory-specific details
+    access_metadata = Column(JSONType)  # Memory-specific details
 
 
 class RequestTrace(Base):
@@ -148,5 +163,15 @@ class RequestTrace(Base):
     latency_ms = Column(Float)
     llm_provider = Column(String(50))  # openai, claude
     model_name = Column(String(100))
-    memory_snapshot = Column(JSON)  # Full memory state for this request
+    memory_snapshot = Column(JSONType)  # Pruned projection; full state in RequestTraceDetail
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class RequestTraceDetail(Base):
+    """Full memory snapshot for a request trace, written off the request path."""
+    __tablename__ = "request_trace_details"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    request_id = Column(String(255), ForeignKey("request_traces.request_id", ondelete="CASCADE"), unique=True, nullable=False, index=True)
+    memory_snapshot = Column(JSONType, nullable=False)  # Full memory state for this request
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
@@ -93,9 +94,18 @@ class LongTermMemory(BaseModel):
     last_updated: datetime
 
 
+@dataclass(slots=True)
+class SemanticHit:
+    """A semantic memory search hit (slotted: no per-instance dict)."""
+    id: str
+    content: str
+    metadata: Dict[str, Any]
+    similarity_score: float
+
+
 class SemanticMemory(BaseModel):
     """Semantic memory schema."""
-    relevant_memories: List[Dict[str, Any]]
+    relevant_memories: List[SemanticHit]
 
 
 class FeedbackMemory(BaseModel):
@@ -2,36 +2,31 @@ import logging
 import sys
 from app.config import settings
 
+# Resolved once at import; settings are frozen
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+LOG_LEVEL = getattr(logging, settings.log_level.upper(), logging.INFO)
+
 
 def setup_logging():
     """Setup structured logging for the application."""
     
-    # Configure logging format
-    log_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    
-    # Set log level from settings
-    log_level = getattr(logging, settings.log_level.upper(), logging.INFO)
-    
     # Configure root logger
     root_logger = logging.getLogger()
     
     # Remove all existing handlers to ensure our configuration takes effect
     if root_logger.hasHandlers():
         root_logger.handlers.clear()
-        
-    logging.basicConfig(
-        level=log_level,
-        format=log_format,
-        handlers=[
-            logging.StreamHandler(sys.stdout)
-        ],
-        force=True  # Ensure this takes effect even if already configured
-    )
     
-    # Set third-party loggers to INFO for debugging
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root_logger.addHandler(handler)
+    root_logger.setLevel(LOG_LEVEL)
+    
     logging.getLogger("uvicorn").setLevel(logging.INFO)
-    logging.getLogger("sqlalchemy").setLevel(logging.INFO)
-    logging.getLogger("chromadb").setLevel(logging.INFO)
+    # SQLAlchemy logs every statement once its logger is enabled for INFO,
+    # even with echo off; statement logging is opt-in via SQL_ECHO instead
+    logging.getLogger("sqlalchemy").setLevel(logging.WARNING)
+    logging.getLogger("chromadb").setLevel(logging.WARNING)
 
 
 def get_logger(name: str) -> logging.Logger:
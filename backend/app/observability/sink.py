@@ -0,0 +1,93 @@
+import asyncio
+import contextlib
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import insert
+from app.config import settings
+from app.db.session import AsyncSessionLocal
+from app.observability.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class TraceSink:
+    """
+    Buffered writer for observability rows (RequestTrace, MemoryAccessLog, ...).
+
+    record() only appends to an in-process buffer. A background task writes
+    the buffer as multi-row INSERTs in a single transaction once
+    trace_sink_batch_size rows are queued or after trace_sink_interval_ms,
+    keeping these writes off the request path.
+    """
+
+    def __init__(self):
+        self._buffer: List[Tuple[Any, Dict[str, Any]]] = []
+        self._pending = asyncio.Event()
+        self._full = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def record(self, model: Any, row: Dict[str, Any]) -> None:
+        """
+        Queue a row for insertion.
+
+        Rows are inserted in the order models were first recorded within a
+        batch, so parents (RequestTrace) land before children (RequestTraceDetail).
+
+        Args:
+            model: ORM model class of the target table
+            row: Column values for the new row
+        """
+        self._buffer.append((model, row))
+
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        self._pending.set()
+        if len(self._buffer) >= settings.trace_sink_batch_size:
+            self._full.set()
+
+    async def _flush_loop(self) -> None:
+        """Drain the buffer in batches until cancelled."""
+        interval = settings.trace_sink_interval_ms / 1000
+
+        while True:
+            await self._pending.wait()
+
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._full.wait(), timeout=interval)
+
+            self._pending.clear()
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write all queued rows in one transaction."""
+        if not self._buffer:
+            return
+
+        batch, self._buffer = self._buffer, []
+        rows_by_model: Dict[Any, List[Dict[str, Any]]] = {}
+        for model, row in batch:
+            rows_by_model.setdefault(model, []).append(row)
+
+        async with AsyncSessionLocal() as db:
+            try:
+                for model, rows in rows_by_model.items():
+                    await db.execute(insert(model), rows)
+                await db.commit()
+                logger.info(f"Stored {len(batch)} observability rows")
+            except Exception as e:
+                logger.error(f"Error storing observability rows: {e}")
+                await db.rollback()
+
+    async def close(self) -> None:
+        """Stop the background task and write any queued rows."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flush_task
+            self._flush_task = None
+
+        await self.flush()
+
+
+# Global trace sink instance
+trace_sink = TraceSink()
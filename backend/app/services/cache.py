@@ -0,0 +1,204 @@
+import hashlib
+import functools
+import re
+from typing import Optional
+import numpy as np
+import orjson
+from cachetools import LRUCache
+from app.config import settings
+from app.models.schemas import SemanticHit
+from app.observability.logger import get_logger
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except Exception as e:
+    REDIS_AVAILABLE = False
+    import logging
+    logging.getLogger(__name__).warning(f"Redis client import failed: {e}")
+
+logger = get_logger(__name__)
+
+_redis_client = None
+
+
+def get_redis():
+    """
+    Get the shared async Redis client.
+
+    Returns:
+        Redis client, or None when Redis is disabled or unavailable
+    """
+    global _redis_client
+
+    if not settings.redis_enabled or not REDIS_AVAILABLE:
+        return None
+
+    if _redis_client is None:
+        _redis_client = aioredis.Redis(
+            host=settings.redis_host,
+            port=settings.redis_port
+        )
+        logger.info(f"Connected Redis cache at {settings.redis_host}:{settings.redis_port}")
+
+    return _redis_client
+
+
+# Bump whenever the vectors produced for an unchanged model change, so
+# stale entries are never served (v2: embeddings are L2-normalized)
+EMBEDDING_CACHE_VERSION = "v2"
+
+
+def embedding_cache_key(model: str, text: str) -> str:
+    """Build the Redis key for an embedding of text under model."""
+    digest = hashlib.sha256(f"{model}:{text}".encode()).hexdigest()
+    return f"emb:{EMBEDDING_CACHE_VERSION}:{model}:{digest}"
+
+
+# Process-local embeddings (float32 arrays) checked before Redis
+_local_embeddings = LRUCache(maxsize=settings.embedding_local_cache_size)
+
+# Wire format of cached embeddings: raw little-endian float32, so payloads
+# are portable across hosts and decode without copying
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+
+def pack_embedding(vector: np.ndarray) -> bytes:
+    """Serialize an embedding for Redis (4 bytes per dimension, no framing)."""
+    return np.asarray(vector, dtype=EMBEDDING_DTYPE).tobytes()
+
+
+def unpack_embedding(payload: bytes) -> Optional[np.ndarray]:
+    """
+    Deserialize a cached embedding as a read-only zero-copy view.
+    
+    Returns:
+        float32 vector, or None if the payload is not a whole number of floats
+    """
+    if len(payload) % EMBEDDING_DTYPE.itemsize:
+        return None
+    return np.frombuffer(payload, dtype=EMBEDDING_DTYPE)
+
+
+def cached_embedding(func):
+    """
+    Cache an async generate_embedding(self, text) method.
+
+    Vectors are kept as read-only float32 arrays in a process-local LRU and,
+    when enabled, in Redis as raw float32 bytes, keyed by the service's
+    embedding model and a hash of the text. Cache errors never fail the call;
+    exceptions from the wrapped method propagate and nothing is cached.
+    """
+    @functools.wraps(func)
+    async def wrapper(self, text: str) -> np.ndarray:
+        key = embedding_cache_key(self.embedding_model, text)
+        local_key = (type(self).__name__, key)
+
+        local = _local_embeddings.get(local_key)
+        if local is not None:
+            return local
+
+        redis = get_redis()
+        if redis is not None:
+            try:
+                cached = await redis.get(key)
+                vector = unpack_embedding(cached) if cached else None
+                if vector is not None:
+                    logger.info("Embedding cache hit")
+                    _local_embeddings[local_key] = vector
+                    return vector
+            except Exception as e:
+                logger.warning(f"Embedding cache read failed: {e}")
+
+        vector = np.asarray(await func(self, text), dtype=np.float32)
+        # Shared by every later hit, so guard against in-place edits
+        vector.setflags(write=False)
+        _local_embeddings[local_key] = vector
+
+        if redis is not None:
+            try:
+                await redis.set(
+                    key,
+                    pack_embedding(vector),
+                    ex=settings.embedding_cache_ttl_seconds
+                )
+            except Exception as e:
+                logger.warning(f"Embedding cache write failed: {e}")
+
+        return vector
+
+    return wrapper
+
+
+def memory_cache_key(user_id: str, conversation_id: str, query: str) -> str:
+    """Build the Redis key for a memory snapshot."""
+    digest = hashlib.sha256(query.encode()).hexdigest()
+    return f"mem:{user_id}:{conversation_id}:{digest}"
+
+
+def _dump_snapshot(snapshot: dict) -> bytes:
+    """Serialize a memory snapshot to JSON (SemanticHit dataclasses become dicts)."""
+    return orjson.dumps(snapshot)
+
+
+def _load_snapshot(data: bytes) -> dict:
+    """Deserialize a memory snapshot, rebuilding its SemanticHit objects."""
+    snapshot = orjson.loads(data)
+    semantic_memory = snapshot.get("semantic_memory") or {}
+    if "relevant_memories" in semantic_memory:
+        semantic_memory["relevant_memories"] = [
+            SemanticHit(**hit) for hit in semantic_memory["relevant_memories"]
+        ]
+    return snapshot
+
+
+async def get_cached_memory(key: str) -> Optional[dict]:
+    """Load a cached memory snapshot, or None on miss."""
+    redis = get_redis()
+    if redis is None:
+        return None
+
+    try:
+        cached = await redis.get(key)
+        if cached:
+            return _load_snapshot(cached)
+    except Exception as e:
+        logger.warning(f"Memory cache read failed: {e}")
+
+    return None
+
+
+async def set_cached_memory(key: str, snapshot: dict) -> None:
+    """Store a memory snapshot with the short memory-cache TTL."""
+    redis = get_redis()
+    if redis is None:
+        return
+
+    try:
+        await redis.setex(key, settings.memory_cache_ttl_seconds, _dump_snapshot(snapshot))
+    except Exception as e:
+        logger.warning(f"Memory cache write failed: {e}")
+
+
+# Redis glob metacharacters (and the escape character itself)
+_GLOB_SPECIAL = re.compile(r"([\\*?\[\]])")
+
+
+def _escape_glob(value: str) -> str:
+    """Escape value for literal matching inside a Redis SCAN MATCH pattern."""
+    return _GLOB_SPECIAL.sub(r"\\\1", value)
+
+
+async def invalidate_memory_cache(user_id: str) -> None:
+    """Delete all cached memory snapshots for a user."""
+    redis = get_redis()
+    if redis is None:
+        return
+
+    try:
+        keys = [key async for key in redis.scan_iter(match=f"mem:{_escape_glob(user_id)}:*")]
+        if keys:
+            await redis.delete(*keys)
+            logger.info(f"Invalidated {len(keys)} memory snapshots for user: {user_id}")
+    except Exception as e:
+        logger.warning(f"Memory cache invalidation failed: {e}")
@@ -1,13 +1,253 @@
-from typing import Optional, List
+import asyncio
+import contextlib
+import functools
+import hashlib
+import itertools
+import time
+from types import ModuleType
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional, List
 from abc import ABC, abstractmethod
+import httpx
+import numpy as np
 import openai
 import anthropic
-from groq import Groq
+import groq
 from app.config import settings
+from app.services.cache import cached_embedding
+from app.core.token_manager import token_manager
 from app.observability.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Keep-alive connection pool shared by every async provider SDK client, so
+# calls reuse warm TCP/TLS connections instead of handshaking per client
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(
+        max_connections=settings.llm_http_max_connections,
+        max_keepalive_connections=settings.llm_http_max_keepalive_connections,
+        keepalive_expiry=120.0
+    )
+)
+
+# Max inputs per OpenAI embeddings request
+OPENAI_EMBEDDING_BATCH_SIZE = 2048
+# Texts per SentenceTransformer forward pass
+SENTENCE_TRANSFORMER_BATCH_SIZE = 64
+# Dimension of the hash fallback embedding (matches all-MiniLM-L6-v2)
+FALLBACK_EMBEDDING_DIM = 384
+# Default in-flight requests for generate_many
+GENERATE_MANY_CONCURRENCY = 16
+# Token limit of the ONNX encoder (SentenceTransformer's max_seq_length for MiniLM)
+ONNX_MAX_SEQ_LENGTH = 256
+
+
+def _l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale embeddings to unit length (last axis), so cosine similarity is a dot product."""
+    return vectors / (np.linalg.norm(vectors, axis=-1, keepdims=True) + 1e-12)
+
+
+class _OnnxSentenceEncoder:
+    """
+    Sentence encoder on ONNX Runtime's CPUExecutionProvider (via optimum).
+    
+    Fused CPU kernels run MiniLM several times faster than PyTorch eager, and
+    an int8-quantized export (EMBEDDING_ONNX_PATH) also shrinks the weights
+    ~4x. Mirrors the part of SentenceTransformer.encode used here: mean
+    pooling over the attention mask, then optional L2 normalization.
+    """
+    
+    def __init__(self, model_name: str):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+        
+        # Without a pre-exported model, export the hub checkpoint on load
+        source = settings.embedding_onnx_path or f"sentence-transformers/{model_name}"
+        self.tokenizer = AutoTokenizer.from_pretrained(source)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            source,
+            export=settings.embedding_onnx_path is None,
+            provider="CPUExecutionProvider"
+        )
+    
+    def encode(
+        self,
+        sentences,
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False
+    ) -> np.ndarray:
+        """Encode one text (1-D result) or a list of texts (2-D result)."""
+        texts = [sentences] if isinstance(sentences, str) else list(sentences)
+        
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=ONNX_MAX_SEQ_LENGTH,
+                return_tensors="np"
+            )
+            token_embeddings = self.model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            batches.append(
+                (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            )
+        
+        embeddings = (
+            np.concatenate(batches).astype(np.float32, copy=False)
+            if batches else np.empty((0, FALLBACK_EMBEDDING_DIM), dtype=np.float32)
+        )
+        if normalize_embeddings:
+            embeddings = _l2_normalize(embeddings)
+        
+        return embeddings[0] if isinstance(sentences, str) else embeddings
+
+
+@functools.lru_cache(maxsize=1)
+def _sentence_transformer(model_name: str):
+    """
+    Load a SentenceTransformer once per process (shared by every GroqService).
+    
+    With EMBEDDING_BACKEND=onnx the model runs on ONNX Runtime instead,
+    falling back to PyTorch if optimum is not installed. On GPU the PyTorch
+    weights are cast to FP16, halving memory and speeding up inference; CPU
+    kernels for FP16 are slower than FP32, so CPU stays FP32.
+    """
+    if settings.embedding_backend == "onnx":
+        try:
+            logger.info("Initializing ONNX encoder for '%s'", model_name)
+            return _OnnxSentenceEncoder(model_name)
+        except ImportError as e:
+            logger.warning("ONNX embedding backend unavailable (%s), using PyTorch", e)
+    
+    from sentence_transformers import SentenceTransformer
+    logger.info("Initializing SentenceTransformer model '%s'", model_name)
+    model = SentenceTransformer(model_name)
+    if model.device.type == "cuda":
+        model.half()
+    
+    return model
+
+
+def _api_keys(primary: Optional[str], extra: str) -> List[Optional[str]]:
+    """Combine a provider's primary key and comma-separated extra keys, deduplicated."""
+    keys = [primary] if primary else []
+    for key in extra.split(","):
+        key = key.strip()
+        if key and key not in keys:
+            keys.append(key)
+    
+    # No key configured: keep one client so the SDK reports the missing key
+    return keys or [primary]
+
+
+def _join_prompt(prompt: str, system_prompt: Optional[str]) -> str:
+    """Full prompt text (system + user) for token counting."""
+    return f"{system_prompt}\n{prompt}" if system_prompt else prompt
+
+
+def _chat_messages(prompt: str, system_prompt: Optional[str]) -> List[Dict[str, str]]:
+    """
+    Build OpenAI-compatible chat messages.
+    
+    The system prompt goes first as its own message: OpenAI caches repeated
+    prompt prefixes automatically, so a stable system message is only
+    prefilled once.
+    """
+    messages = [{"role": "user", "content": prompt}]
+    if system_prompt:
+        messages.insert(0, {"role": "system", "content": system_prompt})
+    return messages
+
+
+def _anthropic_system(system_prompt: Optional[str]) -> Any:
+    """Build Anthropic's system parameter, marked for prompt caching."""
+    if not system_prompt:
+        return anthropic.NOT_GIVEN
+    return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling a provider while its circuit breaker is open."""
+
+
+class _ClientPool:
+    """
+    One SDK client per API key, used round-robin, behind a circuit breaker.
+    
+    Spreads requests across provider accounts so throughput scales with the
+    number of keys; a request rejected with 429 is retried on the next key.
+    Each SDK client already retries transient errors with exponential
+    backoff (llm_max_retries). Once llm_circuit_failure_threshold calls in a
+    row still fail, the circuit opens and calls fail fast for
+    llm_circuit_reset_seconds; the next call after that is the single trial
+    (other calls keep failing fast while it runs) that closes the circuit on
+    success or re-opens it on failure.
+    """
+    
+    def __init__(self, provider: str, sdk: ModuleType, clients: List[Any]):
+        self.provider = provider
+        self.clients = clients
+        self._cycle = itertools.cycle(clients)
+        self._rate_limit_error = sdk.RateLimitError
+        self._transient_errors = (sdk.RateLimitError, sdk.APIConnectionError, sdk.InternalServerError)
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+    
+    def next(self) -> Any:
+        """Get the next client in rotation."""
+        return next(self._cycle)
+    
+    @contextlib.contextmanager
+    def guard(self) -> Iterator[None]:
+        """Fail fast while the circuit is open, and record the outcome of the guarded call."""
+        probe = False
+        if self._opened_at is not None:
+            if self._probing:
+                raise CircuitOpenError(f"{self.provider} circuit half-open, trial call in flight")
+            if time.monotonic() - self._opened_at < settings.llm_circuit_reset_seconds:
+                raise CircuitOpenError(
+                    f"{self.provider} circuit open after {self._failures} consecutive failures"
+                )
+            # Half-open: this call is the only trial until it completes
+            self._probing = probe = True
+        
+        try:
+            yield
+        except self._transient_errors:
+            self._failures += 1
+            if probe or self._failures >= settings.llm_circuit_failure_threshold:
+                logger.warning("Opening %s circuit after %d consecutive failures", self.provider, self._failures)
+                self._opened_at = time.monotonic()
+            raise
+        finally:
+            if probe:
+                self._probing = False
+        
+        self._failures = 0
+        self._opened_at = None
+    
+    async def call(self, request: Callable[[Any], Awaitable[Any]]) -> Any:
+        """
+        Run request(client) on the next client, failing over on rate limits.
+        
+        Args:
+            request: Issues the API call with the given client
+            
+        Returns:
+            The API response
+        """
+        with self.guard():
+            for attempt in range(len(self.clients)):
+                try:
+                    return await request(self.next())
+                except self._rate_limit_error:
+                    if attempt == len(self.clients) - 1:
+                        raise
+                    logger.warning("Rate limited, retrying with next API key")
+
 
 class BaseLLMService(ABC):
     """Abstract base class for LLM providers."""
@@ -17,22 +257,122 @@ class BaseLLMService(ABC):
         self,
         prompt: str,
         max_tokens: int = 1000,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None
     ) -> dict:
         """Generate response from LLM."""
         pass
     
+    async def generate_stream(
+        self,
+        prompt: str,
+        max_tokens: int = 1000,
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None,
+        usage: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream the response from the LLM as text deltas.
+        
+        Providers with a streaming API override this; the default yields the
+        full generate() response as a single chunk.
+        
+        Args:
+            prompt: Input prompt
+            max_tokens: Maximum tokens in response
+            temperature: Sampling temperature
+            system_prompt: Static instructions sent ahead of the prompt as a
+                separate system message, so the provider can cache its prefill
+            usage: Filled with the token usage, model and provider (the
+                keys of generate()'s result) once the stream is exhausted
+            
+        Yields:
+            Response text deltas
+        """
+        result = await self.generate(
+            prompt, max_tokens=max_tokens, temperature=temperature, system_prompt=system_prompt
+        )
+        if usage is not None:
+            usage.update({key: value for key, value in result.items() if key != "response"})
+        yield result["response"]
+    
+    async def generate_many(
+        self,
+        prompts: List[str],
+        concurrency: int = GENERATE_MANY_CONCURRENCY,
+        return_exceptions: bool = False,
+        **kwargs: Any
+    ) -> List[Any]:
+        """
+        Generate responses for many prompts concurrently.
+        
+        Args:
+            prompts: Input prompts
+            concurrency: Maximum requests in flight at once
+            return_exceptions: Return a failed prompt's exception in its slot
+                instead of raising, so one failure doesn't discard the batch
+            **kwargs: Passed to generate() (max_tokens, temperature, system_prompt)
+            
+        Returns:
+            generate() result per prompt, in input order
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def generate_one(prompt: str) -> dict:
+            async with semaphore:
+                return await self.generate(prompt, **kwargs)
+        
+        return list(await asyncio.gather(
+            *(generate_one(prompt) for prompt in prompts),
+            return_exceptions=return_exceptions
+        ))
+    
     @abstractmethod
-    async def generate_embedding(self, text: str) -> List[float]:
-        """Generate embedding for text."""
+    async def generate_embedding(self, text: str) -> np.ndarray:
+        """Generate embedding for text as a unit-length float32 vector."""
         pass
+    
+    async def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        Generate embeddings for many texts.
+        
+        Providers with a native batch API override this; the default fans
+        out to generate_embedding concurrently.
+        
+        Args:
+            texts: Input texts
+            
+        Returns:
+            float32 matrix with one embedding row per text, in input order
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        
+        return np.stack(await asyncio.gather(*(self.generate_embedding(text) for text in texts)))
+    
+    async def _fit_max_tokens(
+        self,
+        prompt: str,
+        max_tokens: int,
+        system_prompt: Optional[str] = None
+    ) -> int:
+        """Cap max_tokens to the room left in this model's context window."""
+        return await asyncio.to_thread(
+            token_manager.max_completion_tokens,
+            _join_prompt(prompt, system_prompt),
+            max_tokens,
+            self.model
+        )
 
 
 class OpenAIService(BaseLLMService):
     """OpenAI LLM service implementation."""
     
     def __init__(self):
-        self.client = openai.OpenAI(api_key=settings.openai_api_key)
+        self.clients = _ClientPool("openai", openai, [
+            openai.AsyncOpenAI(api_key=key, http_client=http_client, max_retries=settings.llm_max_retries)
+            for key in _api_keys(settings.openai_api_key, settings.openai_api_keys)
+        ])
         self.model = settings.default_model
         self.embedding_model = settings.embedding_model
     
@@ -40,7 +380,8 @@ class OpenAIService(BaseLLMService):
         self,
         prompt: str,
         max_tokens: int = 1000,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None
     ) -> dict:
         """
         Generate response using OpenAI API.
@@ -49,19 +390,23 @@ class OpenAIService(BaseLLMService):
             prompt: Input prompt
             max_tokens: Maximum tokens in response
             temperature: Sampling temperature
+            system_prompt: Static instructions sent ahead of the prompt as a
+                separate system message, so the provider can cache its prefill
             
         Returns:
             Dictionary with response and token usage
         """
         try:
-            logger.info(f"Generating response with {self.model}")
+            logger.info("Generating response with %s", self.model)
+            max_tokens = await self._fit_max_tokens(prompt, max_tokens, system_prompt)
+            messages = _chat_messages(prompt, system_prompt)
             
-            response = self.client.chat.completions.create(
+            response = await self.clients.call(lambda client: client.chat.completions.create(
                 model=self.model,
-                messages=[{"role": "user", "content": prompt}],
+                messages=messages,
                 max_tokens=max_tokens,
                 temperature=temperature
-            )
+            ))
             
             result = {
                 "response": response.choices[0].message.content,
@@ -72,15 +417,50 @@ class OpenAIService(BaseLLMService):
                 "provider": "openai"
             }
             
-            logger.info(f"Generated response: {result['total_tokens']} tokens")
+            logger.info("Generated response: %d tokens", result["total_tokens"])
             
             return result
             
         except Exception as e:
-            logger.error(f"Error generating response: {e}")
+            logger.error("Error generating response: %s", e)
             raise
     
-    async def generate_embedding(self, text: str) -> List[float]:
+    async def generate_stream(
+        self,
+        prompt: str,
+        max_tokens: int = 1000,
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None,
+        usage: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a response from the OpenAI API.
+        
+        Args:
+            prompt: Input prompt
+            max_tokens: Maximum tokens in response
+            temperature: Sampling temperature
+            system_prompt: Static instructions sent ahead of the prompt as a
+                separate system message, so the provider can cache its prefill
+            usage: Filled with the (estimated) token usage once the stream ends
+            
+        Yields:
+            Response text deltas
+        """
+        try:
+            logger.info("Streaming response with %s", self.model)
+            
+            async for text in _stream_chat_completion(
+                self, "openai", prompt, max_tokens, temperature, system_prompt, usage
+            ):
+                yield text
+            
+        except Exception as e:
+            logger.error("Error streaming response: %s", e)
+            raise
+    
+    @cached_embedding
+    async def generate_embedding(self, text: str) -> np.ndarray:
         """
         Generate embedding using OpenAI API.
         
@@ -88,37 +468,131 @@ class OpenAIService(BaseLLMService):
             text: Input text
             
         Returns:
-            Embedding vector
+            float32 embedding vector
         """
         try:
-            response = self.client.embeddings.create(
-                model=self.embedding_model,
-                input=text
-            )
+            response = await self._create_embeddings(text)
             
-            embedding = response.data[0].embedding
-            logger.info(f"Generated embedding: {len(embedding)} dimensions")
+            embedding = _l2_normalize(np.asarray(response.data[0].embedding, dtype=np.float32))
+            logger.info("Generated embedding: %d dimensions", len(embedding))
             
             return embedding
             
         except Exception as e:
-            logger.error(f"Error generating embedding: {e}")
+            logger.error("Error generating embedding: %s", e)
             raise
 
 
+    async def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        Generate embeddings using OpenAI's batch input.
+        
+        Args:
+            texts: Input texts
+            
+        Returns:
+            float32 matrix with one embedding row per text, in input order
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        
+        try:
+            # One request per OPENAI_EMBEDDING_BATCH_SIZE texts, issued concurrently
+            chunks = [
+                texts[start:start + OPENAI_EMBEDDING_BATCH_SIZE]
+                for start in range(0, len(texts), OPENAI_EMBEDDING_BATCH_SIZE)
+            ]
+            responses = await asyncio.gather(*(
+                self._create_embeddings(chunk) for chunk in chunks
+            ))
+            
+            embeddings = _l2_normalize(np.asarray([
+                item.embedding
+                for response in responses
+                for item in sorted(response.data, key=lambda item: item.index)
+            ], dtype=np.float32))
+            logger.info("Generated %d embeddings in %d requests", len(embeddings), len(chunks))
+            
+            return embeddings
+            
+        except Exception as e:
+            logger.error("Error generating embeddings: %s", e)
+            raise
+    
+    async def _create_embeddings(self, texts):
+        """Call the embeddings endpoint for one text or a list of texts."""
+        return await self.clients.call(lambda client: client.embeddings.create(
+            model=self.embedding_model,
+            input=texts
+        ))
+
+
+async def _stream_chat_completion(
+    service: BaseLLMService,
+    provider: str,
+    prompt: str,
+    max_tokens: int,
+    temperature: float,
+    system_prompt: Optional[str],
+    usage: Optional[Dict[str, Any]]
+) -> AsyncIterator[str]:
+    """
+    Stream an OpenAI-compatible chat completion (OpenAI, Groq).
+    
+    These streams carry no usage block, so token counts are estimated with
+    tiktoken once the stream ends.
+    """
+    max_tokens = await service._fit_max_tokens(prompt, max_tokens, system_prompt)
+    messages = _chat_messages(prompt, system_prompt)
+    
+    # Failover happens only when opening the stream, before any text is yielded
+    stream = await service.clients.call(lambda client: client.chat.completions.create(
+        model=service.model,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        stream=True
+    ))
+    
+    parts = []
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        text = chunk.choices[0].delta.content
+        if text:
+            parts.append(text)
+            yield text
+    
+    if usage is not None:
+        prompt_tokens, completion_tokens = await asyncio.to_thread(
+            token_manager.count_tokens_batch, [_join_prompt(prompt, system_prompt), "".join(parts)]
+        )
+        usage.update({
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "model": service.model,
+            "provider": provider
+        })
+
+
 class GroqService(BaseLLMService):
     """Groq LLM service implementation."""
     
     def __init__(self):
-        self.client = Groq(api_key=settings.groq_api_key)
+        self.clients = _ClientPool("groq", groq, [
+            groq.AsyncGroq(api_key=key, http_client=http_client, max_retries=settings.llm_max_retries)
+            for key in _api_keys(settings.groq_api_key, settings.groq_api_keys)
+        ])
         self.model = settings.default_model or "llama-3.3-70b-versatile"
-        self._embedding_model = None
+        self.embedding_model = "all-MiniLM-L6-v2"
     
     async def generate(
         self,
         prompt: str,
         max_tokens: int = 1000,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None
     ) -> dict:
         """
         Generate response using Groq API.
@@ -127,19 +601,23 @@ class GroqService(BaseLLMService):
             prompt: Input prompt
             max_tokens: Maximum tokens in response
             temperature: Sampling temperature
+            system_prompt: Static instructions sent ahead of the prompt as a
+                separate system message, so the provider can cache its prefill
             
         Returns:
             Dictionary with response and token usage
         """
         try:
-            logger.info(f"Generating response with Groq {self.model}")
+            logger.info("Generating response with Groq %s", self.model)
+            max_tokens = await self._fit_max_tokens(prompt, max_tokens, system_prompt)
+            messages = _chat_messages(prompt, system_prompt)
             
-            response = self.client.chat.completions.create(
+            response = await self.clients.call(lambda client: client.chat.completions.create(
                 model=self.model,
-                messages=[{"role": "user", "content": prompt}],
+                messages=messages,
                 max_tokens=max_tokens,
                 temperature=temperature
-            )
+            ))
             
             result = {
                 "response": response.choices[0].message.content,
@@ -150,60 +628,144 @@ class GroqService(BaseLLMService):
                 "provider": "groq"
             }
             
-            logger.info(f"Generated response: {result['total_tokens']} tokens")
+            logger.info("Generated response: %d tokens", result["total_tokens"])
             
             return result
             
         except Exception as e:
-            logger.error(f"Error generating response with Groq: {e}")
+            logger.error("Error generating response with Groq: %s", e)
+            raise
+    
+    async def generate_stream(
+        self,
+        prompt: str,
+        max_tokens: int = 1000,
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None,
+        usage: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a response from the Groq API.
+        
+        Args:
+            prompt: Input prompt
+            max_tokens: Maximum tokens in response
+            temperature: Sampling temperature
+            system_prompt: Static instructions sent ahead of the prompt as a
+                separate system message, so the provider can cache its prefill
+            usage: Filled with the (estimated) token usage once the stream ends
+            
+        Yields:
+            Response text deltas
+        """
+        try:
+            logger.info("Streaming response with Groq %s", self.model)
+            
+            async for text in _stream_chat_completion(
+                self, "groq", prompt, max_tokens, temperature, system_prompt, usage
+            ):
+                yield text
+            
+        except Exception as e:
+            logger.error("Error streaming response with Groq: %s", e)
             raise
     
-    async def generate_embedding(self, text: str) -> List[float]:
+    async def generate_embedding(self, text: str) -> np.ndarray:
         """
         Generate embedding using sentence-transformers (Groq doesn't provide embeddings).
         Using a lightweight model for fast local embeddings.
+        
+        The hash fallback is computed outside the embedding cache, so its
+        vectors are never stored under the model's cache key.
         """
         try:
-            if self._embedding_model is None:
-                from sentence_transformers import SentenceTransformer
-                logger.info("Initializing SentenceTransformer model 'all-MiniLM-L6-v2'")
-                self._embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-            
-            embedding = self._embedding_model.encode(text).tolist()
+            return await self._encode_embedding(text)
+        except ImportError:
+            logger.warning("sentence-transformers not installed. Using simple hash-based fallback embedding.")
+            return self._fallback_embedding(text)
+    
+    @cached_embedding
+    async def _encode_embedding(self, text: str) -> np.ndarray:
+        """Encode text with the SentenceTransformer model (raises ImportError without it)."""
+        try:
+            # encode is CPU-bound and releases the GIL: keep it off the event loop
+            model = self._get_embedding_model()
+            embedding = (await asyncio.to_thread(
+                model.encode, text, convert_to_numpy=True, normalize_embeddings=True
+            )).astype(np.float32, copy=False)  # FP16 on GPU
             
-            logger.info(f"Generated embedding: {len(embedding)} dimensions")
+            logger.info("Generated embedding: %d dimensions", len(embedding))
             return embedding
             
         except ImportError:
-            logger.warning("sentence-transformers not installed. Using simple hash-based fallback embedding.")
-            # Simple deterministic fallback: use hash of text to create a repeatable 384-d vector
-            import hashlib
-            import numpy as np
+            raise
+        except Exception as e:
+            logger.error("Error generating embedding: %s", e)
+            raise
+    
+    async def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        Generate embeddings with one batched SentenceTransformer forward pass.
+        
+        Args:
+            texts: Input texts
             
-            # Create a deterministic 384-dimensional vector based on the text hash
-            h = hashlib.sha256(text.encode()).digest()
-            # Use the hash as a seed for reproducibility
-            np.random.seed(int.from_bytes(h[:4], "big"))
-            embedding = np.random.uniform(-1, 1, 384).tolist()
+        Returns:
+            float32 matrix with one embedding row per text, in input order
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        
+        try:
+            model = self._get_embedding_model()
+            embeddings = (await asyncio.to_thread(
+                model.encode, texts, batch_size=SENTENCE_TRANSFORMER_BATCH_SIZE,
+                convert_to_numpy=True, normalize_embeddings=True
+            )).astype(np.float32, copy=False)
             
-            return embedding
+            logger.info("Generated %d embeddings", len(embeddings))
+            return embeddings
+            
+        except ImportError:
+            logger.warning("sentence-transformers not installed. Using simple hash-based fallback embedding.")
+            return np.stack([self._fallback_embedding(text) for text in texts])
         except Exception as e:
-            logger.error(f"Error generating embedding: {e}")
+            logger.error("Error generating embeddings: %s", e)
             raise
+    
+    def _get_embedding_model(self):
+        """Get the process-wide SentenceTransformer model, loading it on first use."""
+        return _sentence_transformer(self.embedding_model)
+    
+    @staticmethod
+    def _fallback_embedding(text: str) -> np.ndarray:
+        """Deterministic hash-derived 384-d unit vector used without sentence-transformers."""
+        # Expand the text hash straight to 384 int32s: no global RNG state, so
+        # it is thread-safe and has no per-call Mersenne Twister setup
+        digest = hashlib.shake_256(text.encode()).digest(FALLBACK_EMBEDDING_DIM * 4)
+        vector = np.frombuffer(digest, dtype=np.int32).astype(np.float32) / 2**31
+        return _l2_normalize(vector)
 
 
 class AnthropicService(BaseLLMService):
     """Anthropic (Claude) LLM service implementation."""
     
     def __init__(self):
-        self.client = anthropic.Anthropic(api_key=settings.anthropic_api_key)
+        self.clients = _ClientPool("anthropic", anthropic, [
+            anthropic.AsyncAnthropic(
+                api_key=settings.anthropic_api_key,
+                http_client=http_client,
+                max_retries=settings.llm_max_retries
+            )
+        ])
         self.model = "claude-3-opus-20240229"
     
     async def generate(
         self,
         prompt: str,
         max_tokens: int = 1000,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None
     ) -> dict:
         """
         Generate response using Anthropic API.
@@ -212,19 +774,25 @@ class AnthropicService(BaseLLMService):
             prompt: Input prompt
             max_tokens: Maximum tokens in response
             temperature: Sampling temperature
+            system_prompt: Static instructions sent ahead of the prompt as a
+                separate system message, so the provider can cache its prefill
             
         Returns:
             Dictionary with response and token usage
         """
         try:
-            logger.info(f"Generating response with {self.model}")
+            logger.info("Generating response with %s", self.model)
+            max_tokens = await self._fit_max_tokens(prompt, max_tokens, system_prompt)
+            system = _anthropic_system(system_prompt)
+            messages = [{"role": "user", "content": prompt}]
             
-            message = self.client.messages.create(
+            message = await self.clients.call(lambda client: client.messages.create(
                 model=self.model,
                 max_tokens=max_tokens,
                 temperature=temperature,
-                messages=[{"role": "user", "content": prompt}]
-            )
+                system=system,
+                messages=messages
+            ))
             
             result = {
                 "response": message.content[0].text,
@@ -235,18 +803,79 @@ class AnthropicService(BaseLLMService):
                 "provider": "anthropic"
             }
             
-            logger.info(f"Generated response: {result['total_tokens']} tokens")
+            logger.info("Generated response: %d tokens", result["total_tokens"])
             
             return result
             
         except Exception as e:
-            logger.error(f"Error generating response: {e}")
+            logger.error("Error generating response: %s", e)
             raise
     
-    async def generate_embedding(self, text: str) -> List[float]:
+    async def generate_stream(
+        self,
+        prompt: str,
+        max_tokens: int = 1000,
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None,
+        usage: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a response from the Anthropic API.
+        
+        Args:
+            prompt: Input prompt
+            max_tokens: Maximum tokens in response
+            temperature: Sampling temperature
+            system_prompt: Static instructions sent ahead of the prompt as a
+                separate system message, so the provider can cache its prefill
+            usage: Filled with the reported token usage once the stream ends
+            
+        Yields:
+            Response text deltas
+        """
+        try:
+            logger.info("Streaming response with %s", self.model)
+            max_tokens = await self._fit_max_tokens(prompt, max_tokens, system_prompt)
+            system = _anthropic_system(system_prompt)
+            messages = [{"role": "user", "content": prompt}]
+            
+            with self.clients.guard():
+                async with self.clients.next().messages.stream(
+                    model=self.model,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    system=system,
+                    messages=messages
+                ) as stream:
+                    async for text in stream.text_stream:
+                        yield text
+                    message = await stream.get_final_message()
+            
+            if usage is not None:
+                usage.update({
+                    "prompt_tokens": message.usage.input_tokens,
+                    "completion_tokens": message.usage.output_tokens,
+                    "total_tokens": message.usage.input_tokens + message.usage.output_tokens,
+                    "model": self.model,
+                    "provider": "anthropic"
+                })
+            
+        except Exception as e:
+            logger.error("Error streaming response: %s", e)
+            raise
+    
+    @functools.cached_property
+    def _openai_fallback(self) -> "OpenAIService":
+        """Shared OpenAI service used for embeddings, created on first use."""
+        return LLMServiceFactory.create("openai")
+    
+    async def generate_embedding(self, text: str) -> np.ndarray:
         """Anthropic doesn't provide embeddings, fallback to OpenAI."""
-        openai_service = OpenAIService()
-        return await openai_service.generate_embedding(text)
+        return await self._openai_fallback.generate_embedding(text)
+    
+    async def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Anthropic doesn't provide embeddings, fallback to OpenAI."""
+        return await self._openai_fallback.generate_embeddings(texts)
 
 
 class LLMServiceFactory:
@@ -255,7 +884,10 @@ class LLMServiceFactory:
     @staticmethod
     def create(provider: Optional[str] = None) -> BaseLLMService:
         """
-        Create LLM service instance.
+        Get the LLM service instance for a provider.
+        
+        Instances are created once per provider and shared, so their SDK
+        clients and models are not rebuilt on every call.
         
         Args:
             provider: LLM provider name (openai, anthropic, groq)
@@ -263,16 +895,23 @@ class LLMServiceFactory:
         Returns:
             LLM service instance
         """
-        provider = provider or settings.default_llm_provider
+        # Resolve the default first so create() and create(default) share an instance
+        return LLMServiceFactory._create(provider or settings.default_llm_provider)
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=8)
+    def _create(provider: str) -> BaseLLMService:
+        """Build the service for a resolved provider name."""
+        services = {
+            "openai": OpenAIService,
+            "anthropic": AnthropicService,
+            "groq": GroqService
+        }
         
-        if provider == "openai":
-            return OpenAIService()
-        elif provider == "anthropic":
-            return AnthropicService()
-        elif provider == "groq":
-            return GroqService()
-        else:
+        if provider not in services:
             raise ValueError(f"Unknown LLM provider: {provider}")
+        
+        return services[provider]()
 
 
 # Global LLM service instance
@@ -9,81 +9,106 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from backend.app.db.session import engine, Base
-from backend.app.models.database import User, UserProfile
+from backend.app.models.database import User, UserProfile, FeedbackCorrection
+from backend.app.core.token_manager import token_manager
+from sqlalchemy import bindparam, inspect, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import sessionmaker
 import uuid
 
+DEMO_USER = {
+    "user_id": "demo_user_123",
+    "email": "demo@memorychat.ai",
+    "hashed_password": "demo_password_hash",  # In production, use proper hashing
+    "full_name": "Demo User",
+    "subscription_tier": "pro"
+}
+
+DEMO_PROFILE_DATA = {
+    "preferences": {
+        "communication_style": "technical",
+        "expertise_level": "senior",
+        "topics_of_interest": ["AI", "SaaS", "Architecture"]
+    },
+    "behavior_patterns": {
+        "typical_session_length": 0,
+        "preferred_response_length": "medium",
+        "frequently_asked_topics": []
+    },
+    "context": {
+        "occupation": "Software Architect",
+        "timezone": "UTC+5:30",
+        "language": "en"
+    }
+}
+
 def init_db():
     """Initialize database with tables."""
     print("Creating database tables...")
     Base.metadata.create_all(bind=engine)
     print("✓ Database tables created")
 
+def migrate_db():
+    """Apply column additions that create_all does not make to existing tables."""
+    columns = {column["name"] for column in inspect(engine).get_columns("feedback_corrections")}
+    if "token_count" in columns:
+        print("✓ Database schema up to date")
+        return
+    
+    table = FeedbackCorrection.__table__
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE feedback_corrections ADD COLUMN token_count INTEGER DEFAULT 0"))
+        
+        # Backfill existing corrections so their stored count is real, not the default
+        rows = conn.execute(select(table.c.id, table.c.user_correction)).all()
+        if rows:
+            conn.execute(
+                update(table)
+                .where(table.c.id == bindparam("row_id"))
+                .values(token_count=bindparam("tokens")),
+                [
+                    {"row_id": row_id, "tokens": token_manager.count_tokens(user_correction or "")}
+                    for row_id, user_correction in rows
+                ]
+            )
+    print(f"✓ Added feedback_corrections.token_count ({len(rows)} rows backfilled)")
+
 def seed_demo_user():
-    """Create a demo user for testing."""
+    """Create a demo user for testing (idempotent, safe to run concurrently)."""
     Session = sessionmaker(bind=engine)
-    db = Session()
+    insert = pg_insert if engine.dialect.name == "postgresql" else sqlite_insert
     
     try:
-        # Check if demo user exists
-        existing_user = db.query(User).filter(User.user_id == "demo_user_123").first()
+        # INSERT ... ON CONFLICT DO NOTHING: no existence SELECT, and a
+        # concurrent run cannot hit a unique violation
+        with Session.begin() as db:
+            result = db.execute(
+                insert(User).values(**DEMO_USER).on_conflict_do_nothing(index_elements=["user_id"])
+            )
+            db.execute(
+                insert(UserProfile)
+                .values(user_id=DEMO_USER["user_id"], profile_data=DEMO_PROFILE_DATA)
+                .on_conflict_do_nothing(index_elements=["user_id"])
+            )
         
-        if existing_user:
+        if result.rowcount == 0:
             print("✓ Demo user already exists")
             return
         
-        # Create demo user
-        demo_user = User(
-            user_id="demo_user_123",
-            email="demo@memorychat.ai",
-            hashed_password="demo_password_hash",  # In production, use proper hashing
-            full_name="Demo User",
-            subscription_tier="pro"
-        )
-        
-        db.add(demo_user)
-        db.commit()
-        
-        # Create default profile
-        demo_profile = UserProfile(
-            user_id="demo_user_123",
-            profile_data={
-                "preferences": {
-                    "communication_style": "technical",
-                    "expertise_level": "senior",
-                    "topics_of_interest": ["AI", "SaaS", "Architecture"]
-                },
-                "behavior_patterns": {
-                    "typical_session_length": 0,
-                    "preferred_response_length": "medium",
-                    "frequently_asked_topics": []
-                },
-                "context": {
-                    "occupation": "Software Architect",
-                    "timezone": "UTC+5:30",
-                    "language": "en"
-                }
-            }
-        )
-        
-        db.add(demo_profile)
-        db.commit()
-        
-        print("✓ Demo user created: demo@memorychat.ai")
-        print("  User ID: demo_user_123")
-        print("  Tier: pro")
+        print(f"✓ Demo user created: {DEMO_USER['email']}")
+        print(f"  User ID: {DEMO_USER['user_id']}")
+        print(f"  Tier: {DEMO_USER['subscription_tier']}")
         
     except Exception as e:
         print(f"✗ Error creating demo user: {e}")
-        db.rollback()
-    finally:
-        db.close()
 
 if __name__ == "__main__":
     print("Initializing MemoryChatAI Database...")
     print("=" * 50)
     
     init_db()
+    migrate_db()
     seed_demo_user()
     
     print("=" * 50)